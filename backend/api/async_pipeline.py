@@ -0,0 +1,384 @@
+"""
+Async version of the generate_bridge pipeline (ingest seeds -> find bridges
+-> LLM explanations) for ASGI deployments. Uses the async Neo4j driver,
+httpx and LangChain's ainvoke so a single worker can keep many requests
+in flight while they wait on Soundcharts, Last.fm, AuraDB and Groq.
+
+Graph writes and the shadow crawl mirror api/ingestion.py and
+api/crawler.py; the bridge queries and ranking layers are shared with
+api/reasoning.py.
+"""
+import asyncio
+import time
+import weakref
+from contextlib import asynccontextmanager
+import httpx
+from django.conf import settings
+from neo4j import AsyncGraphDatabase
+from api.crawler import DEFAULT_EDGE_SCORE, GRAPH_NEIGHBOURS_QUERY, crawl_steps
+from api.timing import PhaseTimer
+from api.ingestion import SHADOW_DNA, numeric_trait_labels, track_id_for
+from api.reasoning import (
+    make_llm, ENRICH_QUERY, FALLBACK_QUERY, RECORD_HITS_QUERY, NO_BRIDGES_SUMMARY,
+    _bridge_query, _bridge_hit_params, _pick_diverse_bridges, _fallback_params, _merge_fallback_rows,
+    _fill_same_artist, _apply_trait_connections, _explanation_prompt,
+    _clean_explanation, _fallback_explanation, _recommendation,
+)
+
+LASTFM_API_URL = "https://ws.audioscrobbler.com/2.0/"
+SOUNDCHARTS_SEARCH_URL = "https://customer.api.soundcharts.com/api/v2/artist/search/{artist_name}"
+
+# Async clients are bound to the event loop that created them
+_clients = weakref.WeakKeyDictionary()
+
+
+def _make_llm(http):
+    # AsyncGroq pools connections on its httpx client, so it gets this loop's
+    return make_llm(http_async_client=http)
+
+
+def _get_clients():
+    """
+    (Neo4j async driver, httpx client, LLM) for the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        driver = AsyncGraphDatabase.driver(
+            settings.NEO4J_URI,
+            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
+        )
+        http = httpx.AsyncClient(timeout=settings.ASYNC_HTTP_TIMEOUT)
+        _clients[loop] = (driver, http, _make_llm(http))
+    return _clients[loop]
+
+
+async def close_clients():
+    """
+    Close the running loop's clients (and with the httpx client, the LLM's
+    connection pool), if it created any.
+    """
+    clients = _clients.pop(asyncio.get_running_loop(), None)
+    if clients is None:
+        return
+    driver, http, _ = clients
+    async with http:
+        await driver.close()
+
+
+@asynccontextmanager
+async def pipeline_clients(keep_open):
+    """
+    Scope for one request's use of the async clients. Under ASGI the loop
+    lives as long as the worker, so clients are kept and pooled across
+    requests (keep_open=True). Under WSGI/runserver Django runs each async
+    view in a throwaway loop, so they are closed when the request ends.
+    """
+    try:
+        yield
+    finally:
+        if not keep_open:
+            await close_clients()
+
+
+async def _cypher(query, params=None):
+    driver, _, _ = _get_clients()
+    records, _, _ = await driver.execute_query(query, params or {})
+    return records
+
+
+# --- EXTERNAL APIS ---
+
+def _as_list(value):
+    # Last.fm collapses single-element lists into an object
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+async def _lastfm(method, **params):
+    _, http, _ = _get_clients()
+    response = await http.get(LASTFM_API_URL, params={
+        "method": method,
+        "api_key": settings.LASTFM_API_KEY,
+        "format": "json",
+        **params
+    })
+    data = response.json()
+    if "error" in data:
+        raise RuntimeError(f"Last.fm {method}: {data.get('message')}")
+    return data
+
+
+async def _lastfm_similar(artist_name, track_title, limit):
+    data = await _lastfm("track.getsimilar", artist=artist_name, track=track_title, limit=limit)
+    tracks = _as_list(data.get("similartracks", {}).get("track"))
+    return [(t["artist"]["name"], t["name"], float(t.get("match", 0))) for t in tracks]
+
+
+async def _lastfm_top_tags(artist_name, track_title, limit=3):
+    data = await _lastfm("track.gettoptags", artist=artist_name, track=track_title)
+    tags = _as_list(data.get("toptags", {}).get("tag"))
+    return [tag["name"] for tag in tags[:limit]]
+
+
+async def _lastfm_playcount(artist_name, track_title):
+    data = await _lastfm("track.getinfo", artist=artist_name, track=track_title)
+    return int(data.get("track", {}).get("playcount") or 0)
+
+
+async def _soundcharts_search(artist_name):
+    _, http, _ = _get_clients()
+    response = await http.get(
+        SOUNDCHARTS_SEARCH_URL.format(artist_name=artist_name),
+        headers={
+            "x-app-id": settings.SOUNDCHARTS_APP_ID,
+            "x-api-key": settings.SOUNDCHARTS_API_KEY
+        }
+    )
+    return response.json()
+
+
+# --- NEO4J PERSISTENCE ---
+
+# Merges on the unique track_id and sets the remaining properties only on
+# create, like api.ingestion.merge_song. Trait edges are one UNWIND MERGE
+# here; the sync path goes through the process-wide trait registry instead.
+SONG_MERGE_QUERY = """
+MERGE (s:Song {track_id: $track_id})
+ON CREATE SET s.title = $title, s.bpm = $bpm, s.energy = $energy, s.valence = $valence,
+              s.popularity = $popularity, s.is_shadow = $is_shadow, s.ingested_at = $now
+WITH s
+FOREACH (_ IN CASE WHEN $is_shadow THEN [] ELSE [1] END | SET s.is_shadow = false)
+MERGE (a:Artist {name: $artist})
+MERGE (s)-[:PERFORMED_BY]->(a)
+RETURN s.bpm, s.energy, s.valence
+"""
+
+TRAITS_MERGE_QUERY = """
+MATCH (s:Song {track_id: $track_id})
+UNWIND $traits AS trait
+MERGE (t:Trait {value: trait.value})
+ON CREATE SET t.type = trait.type
+MERGE (s)-[:HAS_TRAIT]->(t)
+"""
+
+EXISTING_SONGS_QUERY = """
+MATCH (s:Song) WHERE s.track_id IN $track_ids
+RETURN s.track_id
+"""
+
+LINK_SIMILAR_QUERY = """
+MATCH (s:Song {track_id: $track_id})
+UNWIND $links AS link
+MATCH (n:Song {track_id: link.track_id})
+MERGE (s)-[r:SIMILAR_TO]->(n)
+SET r.score = link.score
+"""
+
+
+async def _persist_song(artist_name, track_title, dna, popularity, tags, is_shadow):
+    """
+    Merge a Song with its Artist, numeric traits and vibe tags.
+    Returns the song's track_id.
+    """
+    track_id = track_id_for(artist_name, track_title)
+    records = await _cypher(SONG_MERGE_QUERY, {
+        "track_id": track_id,
+        "title": track_title,
+        "artist": artist_name,
+        "popularity": popularity % 100,
+        "is_shadow": is_shadow,
+        "now": time.time(),
+        **dna
+    })
+    bpm, energy, valence = records[0]
+
+    traits = [{"value": value, "type": trait_type}
+              for value, trait_type in numeric_trait_labels(bpm, energy, valence)]
+    traits += [{"value": tag.lower(), "type": "vibe"} for tag in tags]
+    await _cypher(TRAITS_MERGE_QUERY, {"track_id": track_id, "traits": traits})
+    return track_id
+
+
+async def _ingest_shadow_song(sim_artist_name, sim_track_title):
+    tags, playcount = await asyncio.gather(
+        _lastfm_top_tags(sim_artist_name, sim_track_title),
+        _lastfm_playcount(sim_artist_name, sim_track_title)
+    )
+    return await _persist_song(
+        sim_artist_name, sim_track_title, SHADOW_DNA, playcount, tags, is_shadow=True
+    )
+
+
+async def _graph_neighbours(track_id, limit):
+    rows = await _cypher(GRAPH_NEIGHBOURS_QUERY, {
+        "track_id": track_id,
+        "default_score": DEFAULT_EDGE_SCORE,
+        "limit": limit
+    })
+    return [(row[0], row[1], row[2]) for row in rows]
+
+
+async def _get_song(track_id):
+    rows = await _cypher(EXISTING_SONGS_QUERY, {"track_ids": [track_id]})
+    return rows[0][0] if rows else None
+
+
+async def _link(src_id, dst_id, score):
+    await _cypher(LINK_SIMILAR_QUERY, {"track_id": src_id, "links": [{"track_id": dst_id, "score": score}]})
+
+
+async def crawl_similar_async(track_id, artist_name, track_title, root_similar=None, **budgets):
+    """
+    Async counterpart of api.crawler.crawl_similar. Drives the same
+    crawl_steps generator (frontier, budgets, reuse and top-up rules), so
+    both endpoints build the same graph; only the I/O here is async. Songs
+    are addressed by track_id. Returns the same stats dict.
+    """
+    handlers = {
+        "graph_neighbours": _graph_neighbours,
+        "lastfm_similar": _lastfm_similar,
+        "get_song": _get_song,
+        "ingest": _ingest_shadow_song,
+        "link": _link,
+    }
+    steps = crawl_steps(track_id, track_id, artist_name, track_title, root_similar, **budgets)
+
+    try:
+        request = next(steps)
+        while True:
+            op, *args = request
+            try:
+                result = await handlers[op](*args)
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(result)
+    except StopIteration as done:
+        return done.value
+
+
+async def ingest_track_async(artist_name, track_title, ingest_similar=True, timer=None):
+    """
+    Async counterpart of ingest_track_with_dna. All seed API calls run
+    concurrently. Returns the same log line format.
+    """
+    timer = timer or PhaseTimer()
+    try:
+        # --- PHASE A: API FETCHING ---
+        with timer.phase("fetch"):
+            sc_response, similar, top_tags, playcount = await asyncio.gather(
+                _soundcharts_search(artist_name),
+                _lastfm_similar(artist_name, track_title, settings.SHADOW_CRAWL_FANOUT),
+                _lastfm_top_tags(artist_name, track_title),
+                _lastfm_playcount(artist_name, track_title)
+            )
+        sc_data = sc_response.get('items', [{}])[0]
+
+        # --- PHASE B: NEO4J PERSISTENCE ---
+        dna = {
+            "bpm": sc_data.get('tempo', 120),
+            "energy": sc_data.get('energy', 0.8),
+            "valence": sc_data.get('valence', 0.5)
+        }
+        with timer.phase("persist"):
+            track_id = await _persist_song(
+                artist_name, track_title, dna, playcount, top_tags, is_shadow=False
+            )
+
+        crawled = 0
+        if ingest_similar:
+            with timer.phase("shadow"):
+                stats = await crawl_similar_async(track_id, artist_name, track_title, root_similar=similar)
+            crawled = stats["nodes"]
+
+        return f"✓ Successfully ingested '{track_title}' by {artist_name} with {len(top_tags)} vibe tags and {crawled} similar songs."
+
+    except Exception as e:
+        return f"✗ Ingestion failed for {track_title}: {str(e)}"
+
+
+# --- REASONING ---
+
+async def find_bridges_async(song_titles, input_artists=None):
+    """
+    Async counterpart of find_bridges; same query and ranking layers,
+    with the per-bridge enrichment queries issued concurrently.
+    """
+    input_artists = input_artists or []
+    query, params = _bridge_query(song_titles, input_artists)
+    results = await _cypher(query, params)
+
+    bridges, seen_artists = _pick_diverse_bridges(results)
+
+    if len(bridges) < 2:
+        fallback = await _cypher(
+            FALLBACK_QUERY,
+            _fallback_params(song_titles, input_artists, bridges, seen_artists)
+        )
+        bridges = _merge_fallback_rows(fallback, bridges, seen_artists)
+
+    if len(bridges) < 2:
+        bridges = _fill_same_artist(bridges, results)
+
+    pairs = [(bridge, seed) for bridge in bridges for seed in song_titles]
+    shared = await asyncio.gather(*[
+        _cypher(ENRICH_QUERY, {"bridge_title": bridge["title"], "seed_title": seed})
+        for bridge, seed in pairs
+    ])
+    connections = {}
+    for (bridge, seed), rows in zip(pairs, shared):
+        connections.setdefault(id(bridge), {})[seed] = [row[0] for row in rows]
+    for bridge in bridges:
+        _apply_trait_connections(bridge, connections.get(id(bridge), {}))
+
+    return bridges
+
+
+async def _explain(bridge, i):
+    try:
+        _, _, llm = _get_clients()
+        response = await llm.ainvoke(_explanation_prompt(bridge, i))
+        explanation = _clean_explanation(response.content)
+    except Exception as e:
+        print(f"LLM error for {bridge['title']}: {e}")
+        explanation = _fallback_explanation(bridge)
+    return _recommendation(bridge, explanation)
+
+
+async def find_musical_bridge_async(song_titles, input_artists=None, timer=None):
+    """
+    Async counterpart of find_musical_bridge.
+    """
+    timer = timer or PhaseTimer()
+    if not isinstance(song_titles, list) or len(song_titles) < 2 or len(song_titles) > 3:
+        return {
+            "error": "Please provide 2-3 songs as a list",
+            "recommendations": [],
+            "summary": ""
+        }
+
+    print(f"Finding bridges for: {song_titles}")
+
+    with timer.phase("bridges"):
+        bridges = await find_bridges_async(song_titles, input_artists)
+
+    if not bridges:
+        return {
+            "recommendations": [],
+            "summary": NO_BRIDGES_SUMMARY
+        }
+
+    try:
+        await _cypher(RECORD_HITS_QUERY, _bridge_hit_params(bridges))
+    except Exception as e:
+        print(f"Could not record bridge hits: {e}")
+
+    with timer.phase("explain"):
+        recommendations = await asyncio.gather(*[
+            _explain(bridge, i) for i, bridge in enumerate(bridges)
+        ])
+
+    return {
+        "recommendations": list(recommendations),
+    }
@@ -0,0 +1,251 @@
+import heapq
+import itertools
+import time
+from django.conf import settings
+from neomodel import db
+from api.models import Song
+from api.ingestion import lastfm_network, ingest_shadow_song, track_id_for
+
+# Each hop away from the seed halves a neighbour's priority
+DEPTH_DECAY = 0.5
+# Neighbours by an artist we already reached are less novel
+REPEAT_ARTIST_PENALTY = 0.5
+# SIMILAR_TO edges created before scores were stored on them
+DEFAULT_EDGE_SCORE = 0.5
+# ingest_shadow_song does get_top_tags + get_playcount
+SHADOW_INGEST_API_CALLS = 2
+
+
+def _priority(match, depth, repeat_artist):
+    """
+    Frontier priority: Last.fm similarity, decayed by depth and
+    penalised when the artist is already in the neighbourhood.
+    """
+    priority = match * (DEPTH_DECAY ** depth)
+    if repeat_artist:
+        priority *= REPEAT_ARTIST_PENALTY
+    return priority
+
+
+GRAPH_NEIGHBOURS_QUERY = """
+MATCH (s:Song {track_id: $track_id})-[r:SIMILAR_TO]->(n:Song)-[:PERFORMED_BY]->(a:Artist)
+WITH a.name as artist, n.title as title, coalesce(r.score, $default_score) as score
+RETURN artist, title, score
+ORDER BY score DESC
+LIMIT $limit
+"""
+
+
+def _neighbours_from_graph(track_id, limit):
+    """
+    Already-ingested SIMILAR_TO neighbours, strongest first. No API calls.
+    """
+    results, _ = db.cypher_query(GRAPH_NEIGHBOURS_QUERY, {
+        "track_id": track_id,
+        "default_score": DEFAULT_EDGE_SCORE,
+        "limit": limit
+    })
+    return [(row[0], row[1], row[2]) for row in results]
+
+
+def _link(src_node, dst_node, score):
+    """
+    MERGE the SIMILAR_TO edge on its endpoints only, then set the score;
+    neomodel's connect() merges on the score too and would duplicate an
+    existing edge whose score changed.
+    """
+    db.cypher_query("""
+    MATCH (s:Song), (n:Song) WHERE elementId(s) = $src_id AND elementId(n) = $dst_id
+    MERGE (s)-[r:SIMILAR_TO]->(n)
+    SET r.score = $score
+    """, {"src_id": src_node.element_id, "dst_id": dst_node.element_id, "score": score})
+
+
+def _neighbours_from_lastfm(similar_tracks):
+    return [(sim.item.artist.name, sim.item.title, float(sim.match)) for sim in similar_tracks]
+
+
+def crawl_steps(root, root_id, artist_name, track_title, root_similar=None,
+                max_depth=None, fanout=None, max_nodes=None,
+                max_api_calls=None, time_budget=None):
+    """
+    The crawl algorithm shared by crawl_similar and the async pipeline's
+    crawl_similar_async, as a generator that does no I/O itself. It yields
+    requests and is sent their results; a failed request is thrown back in.
+
+        ("graph_neighbours", track_id, limit)     -> [(artist, title, score)]
+        ("lastfm_similar", artist, title, limit)  -> [(artist, title, match)]
+        ("get_song", track_id)                    -> song handle or None
+        ("ingest", artist, title)                 -> song handle
+        ("link", src_handle, dst_handle, score)   -> ignored
+
+    A song handle is whatever the driver uses to address a Song (a
+    neomodel node, or a track_id); `root` is the seed's handle. Returns the
+    stats dict when exhausted.
+    """
+    max_depth = settings.SHADOW_CRAWL_DEPTH if max_depth is None else max_depth
+    fanout = settings.SHADOW_CRAWL_FANOUT if fanout is None else fanout
+    max_nodes = settings.SHADOW_CRAWL_MAX_NODES if max_nodes is None else max_nodes
+    max_api_calls = settings.SHADOW_CRAWL_MAX_API_CALLS if max_api_calls is None else max_api_calls
+    time_budget = settings.SHADOW_CRAWL_TIME_BUDGET if time_budget is None else time_budget
+
+    stats = {"nodes": 0, "new": 0, "reused": 0, "api_calls": 0, "expanded": 0, "stopped": "frontier"}
+    deadline = time.monotonic() + time_budget
+    visited = {root_id: root}
+    seen_artists = {artist_name}
+
+    # (-priority, tiebreak, depth, artist, title, track_id, handle)
+    tiebreak = itertools.count()
+    frontier = [(-1.0, next(tiebreak), 0, artist_name, track_title, root_id, root)]
+
+    def out_of_budget():
+        if stats["nodes"] >= max_nodes:
+            return "nodes"
+        if time.monotonic() >= deadline:
+            return "time"
+        return None
+
+    while frontier:
+        stopped = out_of_budget()
+        if stopped:
+            stats["stopped"] = stopped
+            break
+
+        _, _, depth, src_artist, src_title, src_id, src = heapq.heappop(frontier)
+
+        # --- Pick neighbours: caller's prefetch > graph, topped up from Last.fm ---
+        if src_id == root_id and root_similar is not None:
+            neighbours = list(root_similar)
+            stored = set()
+        else:
+            try:
+                neighbours = list((yield ("graph_neighbours", src_id, fanout)))
+            except Exception as e:
+                print(f"Skipping expansion of {src_title}: {e}")
+                continue
+            stored = {track_id_for(a, t) for a, t, _ in neighbours}
+            # A node expanded earlier with a smaller fanout (e.g. on the request
+            # path) is widened from Last.fm rather than stuck at its old edges
+            if len(neighbours) < fanout:
+                if stats["api_calls"] >= max_api_calls:
+                    stats["stopped"] = "api_calls"
+                    if not neighbours:
+                        continue
+                else:
+                    stats["api_calls"] += 1
+                    try:
+                        similar = yield ("lastfm_similar", src_artist, src_title, fanout)
+                        neighbours += [
+                            n for n in similar
+                            if track_id_for(n[0], n[1]) not in stored
+                        ]
+                    except Exception as e:
+                        print(f"Skipping Last.fm expansion of {src_title}: {e}")
+                        if not neighbours:
+                            continue
+
+        stats["expanded"] += 1
+        neighbours.sort(
+            key=lambda n: _priority(n[2], depth + 1, n[0] in seen_artists),
+            reverse=True
+        )
+
+        for sim_artist_name, sim_track_title, match in neighbours:
+            if out_of_budget():
+                break
+
+            sim_track_id = track_id_for(sim_artist_name, sim_track_title)
+            if sim_track_id == src_id:
+                continue
+
+            # One bad song (API or Neo4j error) skips that song, not the seed
+            try:
+                # Reached again from another source: link it, but don't re-enqueue
+                if sim_track_id in visited:
+                    if sim_track_id not in stored:
+                        yield ("link", src, visited[sim_track_id], match)
+                    continue
+
+                # Reuse already-ingested songs instead of paying for them again
+                sim_song = yield ("get_song", sim_track_id)
+                reused = sim_song is not None
+                if not reused:
+                    if stats["api_calls"] + SHADOW_INGEST_API_CALLS > max_api_calls:
+                        stats["stopped"] = "api_calls"
+                        break
+                    stats["api_calls"] += SHADOW_INGEST_API_CALLS
+                    sim_song = yield ("ingest", sim_artist_name, sim_track_title)
+
+                visited[sim_track_id] = sim_song
+                if sim_track_id not in stored:
+                    yield ("link", src, sim_song, match)
+            except Exception as e:
+                print(f"Skipping similar song {sim_track_title}: {e}")
+                continue
+
+            stats["reused" if reused else "new"] += 1
+            stats["nodes"] += 1
+
+            priority = _priority(match, depth + 1, sim_artist_name in seen_artists)
+            seen_artists.add(sim_artist_name)
+            if depth + 1 < max_depth:
+                heapq.heappush(frontier, (
+                    -priority, next(tiebreak), depth + 1,
+                    sim_artist_name, sim_track_title, sim_track_id, sim_song
+                ))
+
+    print(f"Crawled {stats['nodes']} songs around '{track_title}' "
+          f"({stats['new']} new, {stats['reused']} reused, "
+          f"{stats['api_calls']} API calls, stopped: {stats['stopped']})")
+    return stats
+
+
+def crawl_similar(root_node, artist_name, track_title, root_similar=None, **budgets):
+    """
+    Grows the shadow graph around a seed by following SIMILAR_TO up to
+    `max_depth` hops. The frontier is a priority queue ordered by similarity
+    score and artist novelty, and the crawl stops at whichever budget runs
+    out first: time (seconds), Last.fm API calls, or songs linked.
+
+    Songs that are already in the graph are linked without re-ingesting
+    them. Nodes are expanded from their stored SIMILAR_TO edges first and
+    topped up from Last.fm when they have fewer than `fanout`, so a
+    re-crawl with a larger fanout widens earlier neighbourhoods. A song
+    reached from several sources gets an edge from each but is only
+    expanded once.
+
+    Args:
+        root_similar: Last.fm get_similar() result for the seed, if the caller
+            already fetched it (saves one API call)
+        budgets: max_depth, fanout, max_nodes, max_api_calls, time_budget;
+            each defaults to its SHADOW_CRAWL_* setting.
+
+    Returns a stats dict: nodes, new, reused, api_calls, expanded, stopped.
+    """
+    handlers = {
+        "graph_neighbours": _neighbours_from_graph,
+        "lastfm_similar": lambda artist, title, limit: _neighbours_from_lastfm(
+            lastfm_network.get_track(artist, title).get_similar(limit=limit)
+        ),
+        "get_song": lambda track_id: Song.nodes.get_or_none(track_id=track_id),
+        "ingest": ingest_shadow_song,
+        "link": _link,
+    }
+    if root_similar is not None:
+        root_similar = _neighbours_from_lastfm(root_similar)
+    steps = crawl_steps(
+        root_node, root_node.track_id, artist_name, track_title, root_similar, **budgets
+    )
+
+    try:
+        request = next(steps)
+        while True:
+            op, *args = request
+            try:
+                result = handlers[op](*args)
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(result)
+    except StopIteration as done:
+        return done.value
@@ -1,8 +1,12 @@
 import os
+import time
 import requests
 import pylast
 from django.conf import settings
-from api.models import Song, Artist, Trait
+from neomodel import db
+from api.models import Artist
+from api.trait_registry import TraitRegistry
+from api.timing import PhaseTimer
 
 # 1. Setup Last.fm Network for "Vibe" and Similarity data
 lastfm_network = pylast.LastFMNetwork(
@@ -10,19 +14,25 @@ lastfm_network = pylast.LastFMNetwork(
     api_secret=settings.LASTFM_SECRET
 )
 
-def create_numeric_traits(song_node, bpm, energy, valence):
+# Placeholder DNA for songs discovered via shadow graphing
+# (could fetch from Soundcharts)
+SHADOW_DNA = {"bpm": 120, "energy": 0.7, "valence": 0.5}
+
+# Cypher predicate (binding `s`) for songs created by shadow graphing. Songs
+# ingested before the is_shadow flag existed are recognised by SHADOW_DNA.
+# Never NULL, so `NOT {SHADOW_PREDICATE}` still matches those older seeds.
+SHADOW_PREDICATE = "(coalesce(s.is_shadow, {}, false) = true)".format(
+    " AND ".join(f"s.{key} = {value}" for key, value in SHADOW_DNA.items())
+)
+
+
+def numeric_trait_labels(bpm, energy, valence):
     """
-    Creates normalized trait nodes that enable cross-genre discovery.
-    These are the "bridges" that connect disparate artists.
+    Quantizes numeric DNA into (value, type) trait pairs.
+    Shared by the sync and async ingestion paths.
     """
     # BPM Buckets (songs within ±10 BPM share a trait)
     bpm_bucket = (bpm // 10) * 10  # e.g., 128 BPM → 120, 171 BPM → 170
-    bpm_trait = Trait.get_or_create({
-        "value": f"{bpm_bucket}-{bpm_bucket+10} BPM",
-        "type": "tempo"
-    })[0]
-    bpm_trait.save()
-    song_node.traits.connect(bpm_trait)
     
     # Energy Tiers (High/Medium/Low)
     if energy >= 0.7:
@@ -32,13 +42,6 @@ def create_numeric_traits(song_node, bpm, energy, valence):
     else:
         energy_label = "Low Energy"
     
-    energy_trait = Trait.get_or_create({
-        "value": energy_label,
-        "type": "energy"
-    })[0]
-    energy_trait.save()
-    song_node.traits.connect(energy_trait)
-    
     # Valence (Mood) - This is KEY for emotional bridges
     if valence >= 0.6:
         mood_label = "Uplifting"
@@ -47,13 +50,6 @@ def create_numeric_traits(song_node, bpm, energy, valence):
     else:
         mood_label = "Melancholic"
     
-    mood_trait = Trait.get_or_create({
-        "value": mood_label,
-        "type": "mood"
-    })[0]
-    mood_trait.save()
-    song_node.traits.connect(mood_trait)
-    
     # BPM Speed Category (additional layer for better matching)
     if bpm >= 140:
         speed_label = "Fast Tempo"
@@ -61,129 +57,166 @@ def create_numeric_traits(song_node, bpm, energy, valence):
         speed_label = "Moderate Tempo"
     else:
         speed_label = "Slow Tempo"
-    
-    speed_trait = Trait.get_or_create({
-        "value": speed_label,
-        "type": "tempo_category"
-    })[0]
-    speed_trait.save()
-    song_node.traits.connect(speed_trait)
+
+    return [
+        (f"{bpm_bucket}-{bpm_bucket+10} BPM", "tempo"),
+        (energy_label, "energy"),
+        (mood_label, "mood"),
+        (speed_label, "tempo_category"),
+    ]
+
+
+# Every numeric trait numeric_trait_labels can produce for 0-300 BPM
+FIXED_TRAIT_VOCABULARY = sorted({
+    label
+    for bpm in range(0, 300, 10)
+    for energy in (0.8, 0.5, 0.1)
+    for valence in (0.8, 0.4, 0.1)
+    for label in numeric_trait_labels(bpm, energy, valence)
+})
+
+# 2. Process-wide Trait element ID cache (fixed vocabulary + LRU of vibe tags)
+trait_registry = TraitRegistry(FIXED_TRAIT_VOCABULARY, max_vibes=settings.TRAIT_CACHE_SIZE)
 
 
-def ingest_track_with_dna(artist_name, track_title, ingest_similar=True):
+def connect_traits(song_node, tags):
+    """
+    Connects the song to its normalized DNA traits and Last.fm vibe tags,
+    the "bridges" that connect disparate artists. Goes through the trait
+    registry, so once warm this is a single query matching cached IDs.
+    """
+    traits = numeric_trait_labels(song_node.bpm, song_node.energy, song_node.valence)
+    traits += [(tag.item.get_name().lower(), "vibe") for tag in tags]
+    trait_registry.connect(song_node, traits)
+
+
+def track_id_for(artist_name, track_title):
+    """
+    Stable Song.track_id used for syncing and de-duplication.
+    """
+    return f"{artist_name}-{track_title}".lower().replace(" ", "_")
+
+
+# Merge on the unique track_id only. Song.get_or_create would MERGE on every
+# required property ({track_id, title}), so a re-cased title would hit the
+# track_id constraint instead of matching. Same shape as the async pipeline.
+SONG_MERGE_QUERY = """
+MERGE (s:Song {track_id: $props.track_id})
+ON CREATE SET s += $props
+RETURN s
+"""
+
+
+def merge_song(props):
+    """
+    Get or create a Song by track_id; `props` are only set on create.
+    """
+    results, _ = db.cypher_query(SONG_MERGE_QUERY, {"props": props}, resolve_objects=True)
+    return results[0][0]
+
+
+def ingest_shadow_song(sim_artist_name, sim_track_title):
+    """
+    Ingests a song discovered through Last.fm similarity ("shadow graphing")
+    with placeholder DNA, its artist and vibe tags. Costs 2 Last.fm calls.
+    Returns the Song node.
+    """
+    sim_lastfm_track = lastfm_network.get_track(sim_artist_name, sim_track_title)
+    sim_tags = sim_lastfm_track.get_top_tags(limit=3)
+
+    # Create or get the similar song node
+    sim_song_node = merge_song({
+        "track_id": track_id_for(sim_artist_name, sim_track_title),
+        "title": sim_track_title,
+        **SHADOW_DNA,
+        "popularity": int(sim_lastfm_track.get_playcount() or 0) % 100,
+        "is_shadow": True,
+        "ingested_at": time.time()
+    })
+
+    # Create artist for similar song
+    sim_artist_node = Artist.get_or_create({"name": sim_artist_name})[0]
+    sim_artist_node.save()
+    sim_song_node.artist.connect(sim_artist_node)
+
+    # **KEY FIX**: Add numeric traits and vibe tags to similar songs
+    connect_traits(sim_song_node, sim_tags)
+
+    return sim_song_node
+
+
+def fetch_soundcharts(artist_name):
+    """
+    Soundcharts artist search; the raw JSON response.
+    """
+    sc_headers = {
+        "x-app-id": settings.SOUNDCHARTS_APP_ID,
+        "x-api-key": settings.SOUNDCHARTS_API_KEY
+    }
+    sc_search_url = f"https://customer.api.soundcharts.com/api/v2/artist/search/{artist_name}"
+    return requests.get(sc_search_url, headers=sc_headers).json()
+
+
+def ingest_track_with_dna(artist_name, track_title, ingest_similar=True, timer=None):
     """
     Orchestrates the fetching of DNA from Soundcharts/Last.fm 
     and saves the resulting Graph Nodes with enhanced trait connections.
     
     Args:
         ingest_similar: If True, also fetch traits for similar songs (creates bridges)
+        timer: Optional PhaseTimer; records "fetch", "persist" and "shadow"
     """
+    timer = timer or PhaseTimer()
     try:
         # --- PHASE A: API FETCHING ---
-        sc_headers = {
-            "x-app-id": settings.SOUNDCHARTS_APP_ID,
-            "x-api-key": settings.SOUNDCHARTS_API_KEY
-        }
-        sc_search_url = f"https://customer.api.soundcharts.com/api/v2/artist/search/{artist_name}"
-        sc_response = requests.get(sc_search_url, headers=sc_headers).json()
-        
-        # Get Last.fm Similarity and Tags
-        lastfm_track = lastfm_network.get_track(artist_name, track_title)
-        similar_tracks = lastfm_track.get_similar(limit=5)
-        top_tags = lastfm_track.get_top_tags(limit=3)
+        with timer.phase("fetch"):
+            sc_response = fetch_soundcharts(artist_name)
+
+            # Get Last.fm Similarity, Tags and Playcount
+            lastfm_track = lastfm_network.get_track(artist_name, track_title)
+            similar_tracks = lastfm_track.get_similar(limit=settings.SHADOW_CRAWL_FANOUT)
+            top_tags = lastfm_track.get_top_tags(limit=3)
+            playcount = int(lastfm_track.get_playcount() or 0)
 
         # --- PHASE B: NEO4J PERSISTENCE ---
-        # 1. Create or Update Artist Node
-        artist_node = Artist.get_or_create({"name": artist_name})[0]
-        artist_node.save() 
-
-        sc_data = sc_response.get('items', [{}])[0]
-
-        # 2. Create the Central Song Node
-        song_node = Song.get_or_create({
-            "track_id": f"{artist_name}-{track_title}".lower().replace(" ", "_"),
-            "title": track_title,
-            "bpm": sc_data.get('tempo', 120),
-            "energy": sc_data.get('energy', 0.8),
-            "valence": sc_data.get('valence', 0.5),
-            "popularity": int(lastfm_track.get_playcount() or 0) % 100 
-        })[0]
-        song_node.save() 
-
-        # 3. Connect Song to Artist
-        song_node.artist.connect(artist_node)
-
-        # 4. Create and Connect Traits
-        create_numeric_traits(
-            song_node, 
-            song_node.bpm, 
-            song_node.energy, 
-            song_node.valence
-        )
-
-        # Add Last.fm vibe tags
-        for tag in top_tags:
-            tag_name = tag.item.get_name()
-            trait_node = Trait.get_or_create({
-                "value": tag_name.lower(), 
-                "type": "vibe"
-            })[0]
-            trait_node.save()
-            song_node.traits.connect(trait_node)
+        with timer.phase("persist"):
+            # 1. Create or Update Artist Node
+            artist_node = Artist.get_or_create({"name": artist_name})[0]
+            artist_node.save() 
+
+            sc_data = sc_response.get('items', [{}])[0]
+
+            # 2. Create the Central Song Node
+            song_node = merge_song({
+                "track_id": track_id_for(artist_name, track_title),
+                "title": track_title,
+                "bpm": sc_data.get('tempo', 120),
+                "energy": sc_data.get('energy', 0.8),
+                "valence": sc_data.get('valence', 0.5),
+                "popularity": playcount % 100,
+                "is_shadow": False,
+                "ingested_at": time.time()
+            })
+            # A song first seen as a shadow neighbour becomes a real seed
+            song_node.is_shadow = False
+            song_node.save() 
+
+            # 3. Connect Song to Artist
+            song_node.artist.connect(artist_node)
+
+            # 4. Create and Connect Traits (numeric DNA + Last.fm vibe tags)
+            connect_traits(song_node, top_tags)
 
         # 5. Build Similarity Bridges WITH TRAITS
+        crawled = 0
         if ingest_similar:
-            for sim in similar_tracks:
-                sim_artist_name = sim.item.artist.name
-                sim_track_title = sim.item.title
-                
-                # Get Last.fm data for the similar song
-                try:
-                    sim_lastfm_track = lastfm_network.get_track(sim_artist_name, sim_track_title)
-                    sim_tags = sim_lastfm_track.get_top_tags(limit=3)
-                    
-                    # Create or get the similar song node
-                    sim_song_node = Song.get_or_create({
-                        "track_id": f"{sim_artist_name}-{sim_track_title}".lower().replace(" ", "_"),
-                        "title": sim_track_title,
-                        "bpm": 120,  # Default for now (could fetch from Soundcharts)
-                        "energy": 0.7,
-                        "valence": 0.5,
-                        "popularity": int(sim_lastfm_track.get_playcount() or 0) % 100
-                    })[0]
-                    sim_song_node.save()
-                    
-                    # Create artist for similar song
-                    sim_artist_node = Artist.get_or_create({"name": sim_artist_name})[0]
-                    sim_artist_node.save()
-                    sim_song_node.artist.connect(sim_artist_node)
-                    
-                    # **KEY FIX**: Add traits to similar songs
-                    create_numeric_traits(
-                        sim_song_node,
-                        sim_song_node.bpm,
-                        sim_song_node.energy,
-                        sim_song_node.valence
-                    )
-                    
-                    # Add vibe tags to similar songs
-                    for tag in sim_tags:
-                        tag_name = tag.item.get_name()
-                        trait_node = Trait.get_or_create({
-                            "value": tag_name.lower(),
-                            "type": "vibe"
-                        })[0]
-                        trait_node.save()
-                        sim_song_node.traits.connect(trait_node)
-                    
-                    # Connect via SIMILAR_TO
-                    song_node.similar_songs.connect(sim_song_node)
-                    
-                except Exception as e:
-                    print(f"Skipping similar song {sim_track_title}: {e}")
-                    continue
-
-        return f"✓ Successfully ingested '{track_title}' by {artist_name} with {len(top_tags)} vibe tags and {len(similar_tracks)} similar songs."
+            # Local import: the crawler builds on ingest_shadow_song below
+            from api.crawler import crawl_similar
+            with timer.phase("shadow"):
+                stats = crawl_similar(song_node, artist_name, track_title, root_similar=similar_tracks)
+            crawled = stats["nodes"]
+
+        return f"✓ Successfully ingested '{track_title}' by {artist_name} with {len(top_tags)} vibe tags and {crawled} similar songs."
 
     except Exception as e:
         return f"✗ Ingestion failed for {track_title}: {str(e)}"
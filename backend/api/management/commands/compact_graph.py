@@ -0,0 +1,266 @@
+import time
+import statistics
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from neomodel import db
+from api.ingestion import SHADOW_PREDICATE
+
+# Never bridged (or not recently) and old enough to have had the chance.
+# A missing ingested_at is NULL here, never stale: see STAMP_UNSTAMPED_QUERY.
+STALE_PREDICATE = """
+coalesce(s.last_bridged_at, 0) < $cutoff AND s.ingested_at < $cutoff
+"""
+
+STALE_MATCH = f"MATCH (s:Song) WHERE {SHADOW_PREDICATE} AND {STALE_PREDICATE}"
+
+# Shadow songs from before ingested_at/last_bridged_at existed have no
+# history, so their retention window starts at the first compaction
+STAMP_UNSTAMPED_QUERY = f"""
+MATCH (s:Song) WHERE {SHADOW_PREDICATE} AND s.ingested_at IS NULL
+WITH s LIMIT $batch
+SET s.ingested_at = $now
+RETURN count(*)
+"""
+
+NODE_LABELS = ["Song", "Artist", "Trait", "ArchivedSong"]
+EDGE_TYPES = ["HAS_TRAIT", "PERFORMED_BY", "SIMILAR_TO"]
+
+
+def graph_counts():
+    """
+    Node counts per label and edge counts per relationship type.
+    """
+    counts = {}
+    for label in NODE_LABELS:
+        results, _ = db.cypher_query(f"MATCH (n:{label}) RETURN count(n)")
+        counts[label] = results[0][0]
+    for rel_type in EDGE_TYPES:
+        results, _ = db.cypher_query(f"MATCH ()-[r:{rel_type}]->() RETURN count(r)")
+        counts[rel_type] = results[0][0]
+    return counts
+
+
+def _run_batched(query, params, batch_size, limit=None):
+    """
+    Re-run a `... WITH x LIMIT $batch <mutation> RETURN count(...)` query
+    until it stops matching, so each batch commits as its own transaction.
+    `limit` caps the total number of rows touched across all batches.
+    """
+    total = 0
+    while limit is None or total < limit:
+        batch = batch_size if limit is None else min(batch_size, limit - total)
+        results, _ = db.cypher_query(query, {**params, "batch": batch})
+        affected = results[0][0] if results else 0
+        total += affected
+        if affected == 0:
+            break
+    return total
+
+
+class Command(BaseCommand):
+    help = (
+        "Compact the knowledge graph: prune or archive stale shadow songs, "
+        "drop traits with degree <= 1 and orphan artists, and cap the number "
+        "of songs. Reports node/edge counts and bridge query latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window-days", type=int, default=settings.SHADOW_RETENTION_DAYS,
+            help="Shadow songs not returned as a bridge within this many days are removed",
+        )
+        parser.add_argument(
+            "--max-songs", type=int, default=settings.GRAPH_MAX_SONGS,
+            help="Evict least recently bridged shadow songs above this many songs (0 = no cap)",
+        )
+        parser.add_argument(
+            "--archive", action="store_true",
+            help="Relabel removed songs as ArchivedSong instead of deleting them",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--probes", type=int, default=3,
+            help="Number of seed pairs used to measure find_bridges latency (0 to skip)",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only report what would be removed",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = time.time() - options["window_days"] * 86400
+        batch_size = options["batch_size"]
+
+        before = graph_counts()
+
+        if options["dry_run"]:
+            self._report_dry_run(cutoff, options["max_songs"])
+            self._report_counts(before, None)
+            return
+
+        probe_pairs = self._probe_pairs(options["probes"])
+        latency_before = self._measure_latency(probe_pairs)
+
+        stamped = _run_batched(STAMP_UNSTAMPED_QUERY, {"now": time.time()}, batch_size)
+
+        removed_stale = _run_batched(
+            self._removal_query(STALE_MATCH, options["archive"]),
+            {"cutoff": cutoff, "now": time.time()},
+            batch_size,
+        )
+
+        removed_cap = 0
+        if options["max_songs"] > 0:
+            results, _ = db.cypher_query("MATCH (s:Song) RETURN count(s)")
+            excess = results[0][0] - options["max_songs"]
+            if excess > 0:
+                removed_cap = _run_batched(
+                    self._removal_query(
+                        f"""
+                        MATCH (s:Song) WHERE {SHADOW_PREDICATE}
+                        WITH s ORDER BY coalesce(s.last_bridged_at, s.ingested_at, 0) ASC
+                        """,
+                        options["archive"],
+                    ),
+                    {"now": time.time()},
+                    batch_size,
+                    limit=excess,
+                )
+
+        removed_traits = _run_batched(
+            """
+            MATCH (t:Trait)
+            WHERE size([(t)<-[:HAS_TRAIT]-(:Song) | 1]) <= 1
+            WITH t LIMIT $batch
+            DETACH DELETE t
+            RETURN count(*)
+            """,
+            {},
+            batch_size,
+        )
+
+        removed_artists = _run_batched(
+            """
+            MATCH (a:Artist)
+            WHERE NOT (a)<-[:PERFORMED_BY]-(:Song)
+            WITH a LIMIT $batch
+            DETACH DELETE a
+            RETURN count(*)
+            """,
+            {},
+            batch_size,
+        )
+
+        after = graph_counts()
+        latency_after = self._measure_latency(probe_pairs)
+
+        verb = "Archived" if options["archive"] else "Pruned"
+        if stamped:
+            self.stdout.write(f"Started the retention window for {stamped} unstamped shadow songs")
+        self.stdout.write(f"{verb} {removed_stale} stale shadow songs (window: {options['window_days']} days)")
+        self.stdout.write(f"{verb} {removed_cap} shadow songs over the size cap")
+        self.stdout.write(f"Removed {removed_traits} traits with degree <= 1")
+        self.stdout.write(f"Removed {removed_artists} orphan artists")
+        self._report_counts(before, after)
+        self._report_latency(latency_before, latency_after, len(probe_pairs))
+        self.stdout.write(self.style.SUCCESS("Compaction complete"))
+
+    def _removal_query(self, match, archive):
+        """
+        Wrap a song MATCH (binding `s`) into a batched delete or archive.
+        Archived songs keep their trait values and artist name as properties
+        but lose the :Song label and every relationship, so they drop out of
+        find_bridges entirely.
+        """
+        if not archive:
+            return match + """
+            WITH s LIMIT $batch
+            DETACH DELETE s
+            RETURN count(*)
+            """
+        return match + """
+        WITH s LIMIT $batch
+        SET s.archived_traits = [(s)-[:HAS_TRAIT]->(t:Trait) | t.value],
+            s.archived_artist = head([(s)-[:PERFORMED_BY]->(a:Artist) | a.name]),
+            s.archived_at = $now
+        REMOVE s:Song
+        SET s:ArchivedSong
+        WITH s
+        OPTIONAL MATCH (s)-[r]-()
+        DELETE r
+        RETURN count(DISTINCT s)
+        """
+
+    def _report_dry_run(self, cutoff, max_songs):
+        results, _ = db.cypher_query(f"{STALE_MATCH} RETURN count(s)", {"cutoff": cutoff})
+        self.stdout.write(f"Would remove {results[0][0]} stale shadow songs")
+
+        results, _ = db.cypher_query(
+            f"MATCH (s:Song) WHERE {SHADOW_PREDICATE} AND s.ingested_at IS NULL RETURN count(s)"
+        )
+        self.stdout.write(f"Would start the retention window for {results[0][0]} unstamped shadow songs")
+
+        if max_songs > 0:
+            results, _ = db.cypher_query("MATCH (s:Song) RETURN count(s)")
+            excess = max(results[0][0] - max_songs, 0)
+            self.stdout.write(f"Song count exceeds cap by {excess}")
+
+        results, _ = db.cypher_query(
+            "MATCH (t:Trait) WHERE size([(t)<-[:HAS_TRAIT]-(:Song) | 1]) <= 1 RETURN count(t)"
+        )
+        self.stdout.write(f"Would remove {results[0][0]} traits with degree <= 1 (before song removal)")
+
+    def _probe_pairs(self, count):
+        """
+        Pick pairs of seed (non-shadow) songs to time find_bridges against.
+        """
+        if count <= 0:
+            return []
+        results, _ = db.cypher_query(
+            f"""
+            MATCH (s:Song)-[:PERFORMED_BY]->(a:Artist)
+            WHERE NOT {SHADOW_PREDICATE}
+            RETURN s.title, a.name
+            LIMIT $limit
+            """,
+            {"limit": count * 2},
+        )
+        return [
+            ([results[i][0], results[i + 1][0]], [results[i][1], results[i + 1][1]])
+            for i in range(0, len(results) - 1, 2)
+        ]
+
+    def _measure_latency(self, probe_pairs):
+        """
+        Median wall-clock milliseconds of find_bridges over the probe pairs,
+        after one untimed pass so the before and after runs are both warm.
+        """
+        if not probe_pairs:
+            return None
+        from api.reasoning import find_bridges
+
+        for titles, artists in probe_pairs:
+            find_bridges(titles, artists)
+
+        timings = []
+        for titles, artists in probe_pairs:
+            start = time.perf_counter()
+            find_bridges(titles, artists)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def _report_counts(self, before, after):
+        self.stdout.write("")
+        self.stdout.write(f"{'':<14}{'before':>10}{'after':>10}")
+        for key, value in before.items():
+            after_value = "-" if after is None else after[key]
+            self.stdout.write(f"{key:<14}{value:>10}{after_value:>10}")
+
+    def _report_latency(self, before_ms, after_ms, probes):
+        if before_ms is None:
+            return
+        change = (after_ms - before_ms) / before_ms * 100 if before_ms else 0
+        self.stdout.write(
+            f"\nfind_bridges median over {probes} seed pairs: "
+            f"{before_ms:.1f} ms -> {after_ms:.1f} ms ({change:+.1f}%)"
+        )
@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+from neomodel import db
+from api.crawler import crawl_similar
+from api.models import Song
+from api.ingestion import SHADOW_PREDICATE, track_id_for
+
+
+class Command(BaseCommand):
+    help = (
+        "Offline shadow-graph crawl: grow dense SIMILAR_TO neighbourhoods around "
+        "seed songs with larger budgets than the request path uses."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed", action="append", default=[], metavar="ARTIST::TITLE",
+            help="Seed song to crawl from (repeatable). Must already be ingested.",
+        )
+        parser.add_argument(
+            "--top", type=int, default=0,
+            help="Also crawl from the N most recently bridged seed songs",
+        )
+        parser.add_argument("--depth", type=int, default=3)
+        parser.add_argument("--fanout", type=int, default=10)
+        parser.add_argument("--max-nodes", type=int, default=100, help="Songs linked per seed")
+        parser.add_argument("--max-api-calls", type=int, default=250, help="Last.fm calls per seed")
+        parser.add_argument("--time-budget", type=float, default=120, help="Seconds per seed")
+
+    def handle(self, *args, **options):
+        seeds = []
+        for spec in options["seed"]:
+            if "::" not in spec:
+                raise CommandError(f"Seed '{spec}' must look like 'Artist::Title'")
+            artist_name, track_title = spec.split("::", 1)
+            seeds.append((artist_name.strip(), track_title.strip()))
+
+        if options["top"] > 0:
+            results, _ = db.cypher_query(
+                f"""
+                MATCH (s:Song)-[:PERFORMED_BY]->(a:Artist)
+                WHERE NOT {SHADOW_PREDICATE}
+                RETURN a.name, s.title
+                ORDER BY coalesce(s.last_bridged_at, 0) DESC, coalesce(s.ingested_at, 0) DESC
+                LIMIT $limit
+                """,
+                {"limit": options["top"]},
+            )
+            seeds.extend((row[0], row[1]) for row in results)
+
+        if not seeds:
+            raise CommandError("Provide at least one --seed or --top N")
+
+        crawled = 0
+        totals = {"nodes": 0, "new": 0, "reused": 0, "api_calls": 0}
+        for artist_name, track_title in seeds:
+            song_node = Song.nodes.get_or_none(track_id=track_id_for(artist_name, track_title))
+            if song_node is None:
+                self.stderr.write(f"Skipping '{track_title}' by {artist_name}: not in the graph")
+                continue
+
+            stats = crawl_similar(
+                song_node, artist_name, track_title,
+                max_depth=options["depth"],
+                fanout=options["fanout"],
+                max_nodes=options["max_nodes"],
+                max_api_calls=options["max_api_calls"],
+                time_budget=options["time_budget"],
+            )
+            crawled += 1
+            for key in totals:
+                totals[key] += stats[key]
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Crawled {crawled} seeds: {totals['nodes']} songs linked "
+            f"({totals['new']} new, {totals['reused']} reused), {totals['api_calls']} API calls"
+        ))
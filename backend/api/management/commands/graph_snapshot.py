@@ -0,0 +1,56 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api.snapshot import export_snapshot, import_rows, load_snapshot, snapshot_chain, snapshot_to_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the graph to a compact columnar NumPy snapshot (full or delta "
+        "since the last one), load it back into Neo4j, or time an mmap load."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["export", "import", "info"])
+        parser.add_argument(
+            "--path", default="snapshots",
+            help="Snapshot root directory holding full-*/delta-* snapshots",
+        )
+        parser.add_argument(
+            "--delta", action="store_true",
+            help="export: only songs ingested since the latest snapshot in --path",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="import: rows per transaction")
+
+    def handle(self, *args, **options):
+        root = options["path"]
+
+        if options["action"] == "export":
+            try:
+                directory, manifest = export_snapshot(root, delta=options["delta"])
+            except ValueError as e:
+                raise CommandError(str(e))
+            self._report_counts(manifest["counts"])
+            self.stdout.write(self.style.SUCCESS(f"Wrote {manifest['kind']} snapshot to {directory}"))
+            return
+
+        if not snapshot_chain(root):
+            raise CommandError(f"No full snapshot under {root}")
+
+        start = time.perf_counter()
+        snapshot = load_snapshot(root)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        if options["action"] == "info":
+            chain = snapshot_chain(root)
+            self.stdout.write(f"Chain: {', '.join(chain)}")
+            self._report_counts(snapshot.counts())
+            self.stdout.write(f"Loaded in {load_ms:.1f} ms")
+            return
+
+        import_rows(snapshot_to_rows(snapshot), batch_size=options["batch_size"])
+        self._report_counts(snapshot.counts())
+        self.stdout.write(self.style.SUCCESS(f"Imported snapshot from {root} into Neo4j"))
+
+    def _report_counts(self, counts):
+        for key, value in counts.items():
+            self.stdout.write(f"{key:<14}{value:>10}")
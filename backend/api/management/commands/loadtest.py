@@ -0,0 +1,304 @@
+import asyncio
+import json
+import math
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from api.timing import parse_server_timing
+
+DEFAULT_TARGETS = [
+    "sync=http://localhost:8000/api/generate-bridge/",
+    "async=http://localhost:8001/api/generate-bridge-async/",
+]
+
+# Realistic mix: mostly pairs, some triples, popular seeds repeat across requests
+SEED_MIX = [
+    [{"artist": "Daft Punk", "title": "One More Time"},
+     {"artist": "The Weeknd", "title": "Blinding Lights"}],
+    [{"artist": "Tame Impala", "title": "The Less I Know the Better"},
+     {"artist": "Dua Lipa", "title": "Levitating"}],
+    [{"artist": "The Weeknd", "title": "Blinding Lights"},
+     {"artist": "Dua Lipa", "title": "Levitating"}],
+    [{"artist": "Fleetwood Mac", "title": "Dreams"},
+     {"artist": "Lorde", "title": "Royals"},
+     {"artist": "Kendrick Lamar", "title": "HUMBLE."}],
+    [{"artist": "Daft Punk", "title": "Get Lucky"},
+     {"artist": "Chic", "title": "Le Freak"}],
+    [{"artist": "Radiohead", "title": "Everything In Its Right Place"},
+     {"artist": "Aphex Twin", "title": "Xtal"}],
+]
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def _sample(status, latency_ms, phases=None, body=None):
+    log = (body or {}).get("ingestion_log", [])
+    return {
+        "status": status,
+        "latency_ms": latency_ms,
+        "phases": phases or {},
+        "partial": any(entry.startswith("✗") for entry in log),
+    }
+
+
+# --- SENDERS: one request -> (status, phases, body) ---
+
+def http_sender(client, url):
+    async def send(payload):
+        try:
+            response = await client.post(url, json=payload)
+        except httpx.TimeoutException:
+            return "timeout", {}, None
+        except httpx.HTTPError:
+            return "error", {}, None
+        if response.status_code != 200:
+            return "error", {}, None
+        return "ok", parse_server_timing(response.headers.get("Server-Timing")), response.json()
+    return send
+
+
+def in_process_sender(path, timeout, executor):
+    """
+    Drive the Django view directly from `executor`'s worker threads (no
+    server), one test Client per thread. Size the executor to the
+    concurrency: a timed-out call keeps its thread until the view returns,
+    just as it would keep a server worker busy.
+    """
+    local = threading.local()
+    host = next((h for h in settings.ALLOWED_HOSTS if h and h != "*"), "localhost")
+
+    def post(payload):
+        if not hasattr(local, "client"):
+            local.client = Client(HTTP_HOST=host)
+        response = local.client.post(path, data=json.dumps(payload), content_type="application/json")
+        return response.status_code, response.headers.get("Server-Timing"), response.content
+
+    async def send(payload):
+        loop = asyncio.get_running_loop()
+        try:
+            status, timing, content = await asyncio.wait_for(
+                loop.run_in_executor(executor, post, payload), timeout
+            )
+        except asyncio.TimeoutError:
+            return "timeout", {}, None
+        except Exception:
+            return "error", {}, None
+        if status != 200:
+            return "error", {}, None
+        return "ok", parse_server_timing(timing), json.loads(content)
+    return send
+
+
+async def run_load(send, seed_mix, total, concurrency, rate, rng):
+    """
+    Replays `total` requests drawn from `seed_mix` with at most `concurrency`
+    in flight.
+
+    rate=None is a closed loop: each slot sends its next request when the
+    previous one returns; latency is measured from send. With a rate (req/s)
+    requests arrive as a Poisson process regardless of how the server keeps
+    up, and latency is measured from the scheduled arrival, so time spent
+    queued behind the concurrency cap counts (no coordinated omission).
+    """
+    samples = []
+    slots = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def one(payload, scheduled):
+        async with slots:
+            started = loop.time()
+            status, phases, body = await send(payload)
+        origin = scheduled if rate else started
+        samples.append(_sample(status, (loop.time() - origin) * 1000, phases, body))
+
+    start = loop.time()
+    tasks = []
+    arrival = start
+    for _ in range(total):
+        payload = {"seeds": rng.choice(seed_mix)}
+        if rate:
+            arrival += rng.expovariate(rate)
+            await asyncio.sleep(max(arrival - loop.time(), 0))
+        tasks.append(asyncio.create_task(one(payload, arrival if rate else start)))
+    await asyncio.gather(*tasks)
+    return samples, loop.time() - start
+
+
+def summarize(samples, wall):
+    latencies = sorted(s["latency_ms"] for s in samples if s["status"] == "ok")
+    total = len(samples)
+    phases = {}
+    for s in samples:
+        for name, ms in s["phases"].items():
+            phases.setdefault(name, []).append(ms)
+
+    summary = {
+        "requests": total,
+        "ok": len(latencies),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else 0.0,
+        "error_rate": round(sum(s["status"] == "error" for s in samples) / total, 4) if total else 0.0,
+        "timeout_rate": round(sum(s["status"] == "timeout" for s in samples) / total, 4) if total else 0.0,
+        "partial_rate": round(sum(s["partial"] for s in samples) / total, 4) if total else 0.0,
+        "latency_ms": {f"p{p}": round(percentile(latencies, p), 1) for p in (50, 90, 95, 99)},
+        "phases_ms": {},
+    }
+    summary["latency_ms"]["max"] = round(latencies[-1], 1) if latencies else 0.0
+    for name, values in phases.items():
+        values.sort()
+        summary["phases_ms"][name] = {
+            "p50": round(percentile(values, 50), 1),
+            "p95": round(percentile(values, 95), 1),
+            "mean": round(sum(values) / len(values), 1),
+        }
+    return summary
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test generate-bridge: replay a seed mix against one or more targets "
+        "(HTTP servers, or in-process view paths starting with '/') at a given "
+        "concurrency and optional Poisson arrival rate. Reports throughput, latency "
+        "percentiles, error/timeout rates and the per-phase breakdown from the "
+        "Server-Timing header. Start servers with USE_API_STANDINS=True (or pass "
+        "--standins for in-process targets) to replace Soundcharts, Last.fm and "
+        "the LLM with local stand-ins; these require STANDIN_NEO4J_URI, a scratch "
+        "database separate from NEO4J_URI."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target", action="append", metavar="NAME=URL_OR_PATH",
+            help=f"Endpoint to load (repeatable). Default: {' and '.join(DEFAULT_TARGETS)}",
+        )
+        parser.add_argument("--concurrency", type=int, default=16, help="Max requests in flight")
+        parser.add_argument("--requests", type=int, default=64)
+        parser.add_argument(
+            "--rate", type=float, default=None,
+            help="Open-loop arrival rate in req/s (default: closed loop)",
+        )
+        parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout in seconds")
+        parser.add_argument(
+            "--seeds-file",
+            help="JSON list of seed lists ([{'artist': ..., 'title': ...}, ...]) to replay",
+        )
+        parser.add_argument("--random-seed", type=int, default=0, help="Makes the request mix repeatable")
+        parser.add_argument(
+            "--standins", action="store_true",
+            help="Install API/LLM stand-ins in this process (in-process targets)",
+        )
+        parser.add_argument("--label", default="", help="Free-form run label, e.g. 'gunicorn -w 4'")
+        parser.add_argument("--json", dest="json_path", help="Write the results here for later comparison")
+
+    def handle(self, *args, **options):
+        targets = []
+        for spec in options["target"] or DEFAULT_TARGETS:
+            if "=" not in spec:
+                raise CommandError(f"Target '{spec}' must look like 'name=http://host/path/' or 'name=/path/'")
+            targets.append(spec.split("=", 1))
+
+        seed_mix = SEED_MIX
+        if options["seeds_file"]:
+            with open(options["seeds_file"]) as f:
+                seed_mix = json.load(f)
+            if not seed_mix:
+                raise CommandError("Seeds file is empty")
+
+        if options["standins"] and not settings.USE_API_STANDINS:
+            from api import standins
+            try:
+                standins.install()
+            except ImproperlyConfigured as e:
+                raise CommandError(str(e))
+
+        standin_latency_ms = None
+        if options["standins"] or settings.USE_API_STANDINS:
+            from api import standins
+            try:
+                standin_latency_ms = standins.parse_latencies(settings.STANDIN_LATENCY_MS)
+            except ImproperlyConfigured as e:
+                raise CommandError(str(e))
+
+        mode = f"{options['rate']} req/s open loop" if options["rate"] else "closed loop"
+        self.stdout.write(
+            f"{options['requests']} requests per target, concurrency {options['concurrency']}, {mode}\n"
+        )
+
+        results = []
+        for name, url in targets:
+            rng = random.Random(options["random_seed"])
+            samples, wall = asyncio.run(self._run_target(url, seed_mix, rng, options))
+            summary = summarize(samples, wall)
+            results.append({"target": name, "url": url, **summary})
+            self._report(name, summary)
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as f:
+                json.dump({
+                    "label": options["label"],
+                    "revision": git_revision(),
+                    "timestamp": time.time(),
+                    "concurrency": options["concurrency"],
+                    "rate": options["rate"],
+                    "requests": options["requests"],
+                    "random_seed": options["random_seed"],
+                    "standins": options["standins"] or settings.USE_API_STANDINS,
+                    "standin_latency_ms": standin_latency_ms,
+                    "results": results,
+                }, f, indent=2)
+            self.stdout.write(f"\nWrote {options['json_path']}")
+
+    async def _run_target(self, url, seed_mix, rng, options):
+        args = (seed_mix, options["requests"], options["concurrency"], options["rate"], rng)
+        if url.startswith("/"):
+            # The default executor (min(32, cpus + 4) threads) would cap concurrency
+            executor = ThreadPoolExecutor(max_workers=options["concurrency"])
+            try:
+                return await run_load(in_process_sender(url, options["timeout"], executor), *args)
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+        limits = httpx.Limits(max_connections=options["concurrency"])
+        async with httpx.AsyncClient(timeout=options["timeout"], limits=limits) as client:
+            return await run_load(http_sender(client, url), *args)
+
+    def _report(self, name, summary):
+        latency = summary["latency_ms"]
+        self.stdout.write(self.style.MIGRATE_HEADING(f"[{name}]"))
+        self.stdout.write(
+            f"  throughput {summary['throughput_rps']:.2f} req/s   ok {summary['ok']}/{summary['requests']}   "
+            f"errors {summary['error_rate']:.1%}   timeouts {summary['timeout_rate']:.1%}   "
+            f"partial ingests {summary['partial_rate']:.1%}"
+        )
+        self.stdout.write(
+            f"  latency ms  p50 {latency['p50']:.0f}  p90 {latency['p90']:.0f}  "
+            f"p95 {latency['p95']:.0f}  p99 {latency['p99']:.0f}  max {latency['max']:.0f}"
+        )
+        if summary["phases_ms"]:
+            self.stdout.write(f"  {'phase':<10}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+            for phase, stats in sorted(summary["phases_ms"].items(), key=lambda item: -item[1]["p95"]):
+                self.stdout.write(f"  {phase:<10}{stats['p50']:>10.0f}{stats['p95']:>10.0f}{stats['mean']:>10.0f}")
@@ -3,7 +3,8 @@ from django.db import models
 # Create your models here.
 from neomodel import (
     StructuredNode, StringProperty, IntegerProperty, 
-    FloatProperty, RelationshipTo, RelationshipFrom, config
+    FloatProperty, BooleanProperty, RelationshipTo, RelationshipFrom,
+    StructuredRel, config
 )
 # Backend A: This defines the core Knowledge Graph structure 
 
@@ -27,6 +28,13 @@ class Artist(StructuredNode):
 
     songs = RelationshipFrom('Song', 'PERFORMED_BY')
 
+class SimilarRel(StructuredRel):
+    """
+    Last.fm similarity between two songs, kept so the shadow-graph crawler
+    can rank already-ingested neighbours without another API call.
+    """
+    score = FloatProperty() # Last.fm match, 0-1
+
 class Song(StructuredNode):
     """
     The central node enriched with Soundcharts DNA and Last.fm metadata[cite: 14, 15].
@@ -42,9 +50,14 @@ class Song(StructuredNode):
     
     # Social Metadata from Last.fm for "Hipster" Logic 
     popularity = IntegerProperty(default=0)
+
+    # Bookkeeping for graph compaction (epoch seconds)
+    is_shadow = BooleanProperty(default=False) # True for songs only added via SIMILAR_TO expansion
+    ingested_at = FloatProperty()
+    last_bridged_at = FloatProperty() # Last time this song was returned as a bridge
     
     # Relationships 
     artist = RelationshipTo('Artist', 'PERFORMED_BY')
     traits = RelationshipTo('Trait', 'HAS_TRAIT')
 
-    similar_songs = RelationshipTo('Song', 'SIMILAR_TO')
\ No newline at end of file
+    similar_songs = RelationshipTo('Song', 'SIMILAR_TO', model=SimilarRel)
\ No newline at end of file
@@ -1,32 +1,43 @@
 import os
+import time
+from django.conf import settings
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
 from langchain_neo4j import Neo4jGraph
 from neomodel import db
+from api.ingestion import track_id_for
+from api.timing import PhaseTimer
 
 load_dotenv()
 
 # Connect to Neo4j
 graph = Neo4jGraph(
-    url=os.getenv("NEO4J_URI"),
-    username=os.getenv("NEO4J_USERNAME"),
-    password=os.getenv("NEO4J_PASSWORD"),
+    url=settings.NEO4J_URI,
+    username=settings.NEO4J_USER,
+    password=settings.NEO4J_PASSWORD,
     refresh_schema=False
 )
 
-llm = ChatGroq(
-    groq_api_key=os.getenv("GROQ_API_KEY"),
-    model_name="llama-3.3-70b-versatile",
-    temperature=0.7
-)
+def make_llm(**client_options):
+    """
+    The explanation LLM. client_options (e.g. http_async_client) let the
+    async pipeline give each event loop its own connection pool.
+    """
+    return ChatGroq(
+        groq_api_key=os.getenv("GROQ_API_KEY"),
+        model_name="llama-3.3-70b-versatile",
+        temperature=0.7,
+        **client_options
+    )
 
-def find_bridges(song_titles, input_artists=None):
+
+llm = make_llm()
+
+def _bridge_query(song_titles, input_artists):
     """
-    Execute hardcoded Cypher query for 2 or 3 input songs.
-    Uses weighted scoring (numeric traits 2pts > vibe tags 1pt),
-    enforces artist diversity, and falls back to SIMILAR_TO edges.
+    Build the weighted HAS_TRAIT bridge query for 2 or 3 input songs.
+    Returns (query, params).
     """
-    input_artists = input_artists or []
     song_params = {f"song{i}": title for i, title in enumerate(song_titles)}
 
     if len(song_titles) == 2:
@@ -58,24 +69,61 @@ def find_bridges(song_titles, input_artists=None):
     """
 
     song_params["input_artists"] = input_artists
-    results, meta = db.cypher_query(query, song_params)
+    return query, song_params
 
-    # --- Layer 1: Pick top 2 with different artists ---
+
+def _bridge_from_row(row):
+    return {
+        "title": row[0],
+        "artist": row[1],
+        "shared_traits": row[2],
+        "trait_count": row[3],
+        "score": row[4]
+    }
+
+
+def _pick_diverse_bridges(results):
+    """
+    Layer 1: Pick top 2 with different artists.
+    Returns (bridges, seen_artists).
+    """
     bridges = []
     seen_artists = set()
     for row in results:
         artist = row[1]
         if artist not in seen_artists:
-            bridges.append({
-                "title": row[0],
-                "artist": artist,
-                "shared_traits": row[2],
-                "trait_count": row[3],
-                "score": row[4]
-            })
+            bridges.append(_bridge_from_row(row))
             seen_artists.add(artist)
         if len(bridges) >= 2:
             break
+    return bridges, seen_artists
+
+
+def _fill_same_artist(bridges, results):
+    """
+    Layer 3: allow same artist rather than fewer results.
+    """
+    seen_titles = {b["title"] for b in bridges}
+    for row in results:
+        if row[0] not in seen_titles:
+            bridges.append(_bridge_from_row(row))
+        if len(bridges) >= 2:
+            break
+    return bridges
+
+
+def find_bridges(song_titles, input_artists=None):
+    """
+    Execute hardcoded Cypher query for 2 or 3 input songs.
+    Uses weighted scoring (numeric traits 2pts > vibe tags 1pt),
+    enforces artist diversity, and falls back to SIMILAR_TO edges.
+    """
+    input_artists = input_artists or []
+    query, params = _bridge_query(song_titles, input_artists)
+    results, meta = db.cypher_query(query, params)
+
+    # --- Layer 1: Pick top 2 with different artists ---
+    bridges, seen_artists = _pick_diverse_bridges(results)
 
     # --- Layer 2: Fallback to SIMILAR_TO if < 2 diverse bridges ---
     if len(bridges) < 2:
@@ -83,18 +131,7 @@ def find_bridges(song_titles, input_artists=None):
 
     # --- Layer 3: If still < 2, allow same artist rather than fewer results ---
     if len(bridges) < 2:
-        seen_titles = {b["title"] for b in bridges}
-        for row in results:
-            if row[0] not in seen_titles:
-                bridges.append({
-                    "title": row[0],
-                    "artist": row[1],
-                    "shared_traits": row[2],
-                    "trait_count": row[3],
-                    "score": row[4]
-                })
-            if len(bridges) >= 2:
-                break
+        bridges = _fill_same_artist(bridges, results)
 
     # --- Enrich: get per-bridge trait connections to each input song ---
     bridges = _enrich_bridge_traits(bridges, song_titles)
@@ -102,6 +139,26 @@ def find_bridges(song_titles, input_artists=None):
     return bridges
 
 
+ENRICH_QUERY = """
+MATCH (bridge:Song {title: $bridge_title})-[:HAS_TRAIT]->(t:Trait)<-[:HAS_TRAIT]-(seed:Song {title: $seed_title})
+RETURN t.value as trait, t.type as type
+"""
+
+
+def _apply_trait_connections(bridge, trait_connections):
+    """
+    Attach per-seed trait connections and replace shared_traits with their union.
+    """
+    all_traits = set()
+    for traits_for_seed in trait_connections.values():
+        all_traits.update(traits_for_seed)
+
+    bridge["trait_connections"] = trait_connections
+    bridge["shared_traits"] = list(all_traits)
+    bridge["trait_count"] = len(all_traits)
+    return bridge
+
+
 def _enrich_bridge_traits(bridges, song_titles):
     """
     For each bridge, query which traits it shares with EACH individual input song.
@@ -110,50 +167,38 @@ def _enrich_bridge_traits(bridges, song_titles):
     """
     for bridge in bridges:
         trait_connections = {}
-        all_traits = set()
 
         for song_title in song_titles:
-            query = """
-            MATCH (bridge:Song {title: $bridge_title})-[:HAS_TRAIT]->(t:Trait)<-[:HAS_TRAIT]-(seed:Song {title: $seed_title})
-            RETURN t.value as trait, t.type as type
-            """
-            results, _ = db.cypher_query(query, {
+            results, _ = db.cypher_query(ENRICH_QUERY, {
                 "bridge_title": bridge["title"],
                 "seed_title": song_title
             })
-            traits_for_seed = [row[0] for row in results]
-            trait_connections[song_title] = traits_for_seed
-            all_traits.update(traits_for_seed)
+            trait_connections[song_title] = [row[0] for row in results]
 
-        bridge["trait_connections"] = trait_connections
-        bridge["shared_traits"] = list(all_traits)
-        bridge["trait_count"] = len(all_traits)
+        _apply_trait_connections(bridge, trait_connections)
 
     return bridges
 
 
-def _fallback_similar_to(song_titles, input_artists, existing_bridges, seen_artists):
-    """
-    Fallback: find bridges via SIMILAR_TO edges when HAS_TRAIT returns < 2.
-    """
-    exclude_titles = list(song_titles) + [b["title"] for b in existing_bridges]
-    exclude_artists = list(seen_artists) + list(input_artists)
-
-    query = """
-    MATCH (s:Song)-[:SIMILAR_TO]->(bridge:Song)-[:PERFORMED_BY]->(artist:Artist)
-    WHERE s.title IN $input_songs AND NOT bridge.title IN $exclude AND NOT artist.name IN $exclude_artists
-    OPTIONAL MATCH (bridge)-[:HAS_TRAIT]->(t:Trait)
-    WITH bridge, artist, collect(DISTINCT t.value) as traits
-    RETURN bridge.title as title, artist.name as artist, traits
-    LIMIT 4
-    """
+FALLBACK_QUERY = """
+MATCH (s:Song)-[:SIMILAR_TO]->(bridge:Song)-[:PERFORMED_BY]->(artist:Artist)
+WHERE s.title IN $input_songs AND NOT bridge.title IN $exclude AND NOT artist.name IN $exclude_artists
+OPTIONAL MATCH (bridge)-[:HAS_TRAIT]->(t:Trait)
+WITH bridge, artist, collect(DISTINCT t.value) as traits
+RETURN bridge.title as title, artist.name as artist, traits
+LIMIT 4
+"""
 
-    results, meta = db.cypher_query(query, {
+
+def _fallback_params(song_titles, input_artists, existing_bridges, seen_artists):
+    return {
         "input_songs": list(song_titles),
-        "exclude": exclude_titles,
-        "exclude_artists": exclude_artists
-    })
+        "exclude": list(song_titles) + [b["title"] for b in existing_bridges],
+        "exclude_artists": list(seen_artists) + list(input_artists)
+    }
+
 
+def _merge_fallback_rows(results, existing_bridges, seen_artists):
     for row in results:
         artist = row[1]
         if artist not in seen_artists:
@@ -171,34 +216,66 @@ def _fallback_similar_to(song_titles, input_artists, existing_bridges, seen_arti
     return existing_bridges
 
 
-def generate_individual_explanations(song_titles, bridges):
+def _fallback_similar_to(song_titles, input_artists, existing_bridges, seen_artists):
     """
-    Generate a unique explanation for each bridge recommendation.
-    Uses per-seed trait connections for specificity.
+    Fallback: find bridges via SIMILAR_TO edges when HAS_TRAIT returns < 2.
     """
-    if not bridges:
-        return []
+    results, meta = db.cypher_query(
+        FALLBACK_QUERY,
+        _fallback_params(song_titles, input_artists, existing_bridges, seen_artists)
+    )
+    return _merge_fallback_rows(results, existing_bridges, seen_artists)
+
+
+# Bridges are matched on track_id (unique index) so only the song that was
+# returned is stamped, not every song sharing its title
+RECORD_HITS_QUERY = """
+UNWIND $track_ids AS track_id
+MATCH (s:Song {track_id: track_id})
+SET s.last_bridged_at = $now
+"""
+
+
+def _bridge_hit_params(bridges):
+    return {
+        "track_ids": [track_id_for(b["artist"], b["title"]) for b in bridges],
+        "now": time.time()
+    }
+
+
+def _record_bridge_hits(bridges):
+    """
+    Stamp returned bridges with last_bridged_at so compact_graph knows
+    which shadow songs are actually earning their place in the graph.
+    """
+    try:
+        db.cypher_query(RECORD_HITS_QUERY, _bridge_hit_params(bridges))
+    except Exception as e:
+        print(f"Could not record bridge hits: {e}")
 
-    recommendations = []
-    for i, bridge in enumerate(bridges):
-        # Build per-seed connection details
-        connection_details = []
-        trait_connections = bridge.get("trait_connections", {})
-        for seed, traits in trait_connections.items():
-            if traits:
-                connection_details.append(f"- Connects to '{seed}' through: {', '.join(traits)}")
 
-        connections_str = "\n".join(connection_details) if connection_details else "General musical similarity"
+def _explanation_prompt(bridge, i):
+    """
+    Build the LLM prompt for the i-th bridge.
+    """
+    # Build per-seed connection details
+    connection_details = []
+    trait_connections = bridge.get("trait_connections", {})
+    for seed, traits in trait_connections.items():
+        if traits:
+            connection_details.append(f"- Connects to '{seed}' through: {', '.join(traits)}")
 
-        # Vary the prompt angle per bridge
-        angles = [
-            "Focus on what makes this song a surprising or unexpected link.",
-            "Focus on the sonic texture and production choices that tie these together.",
-            "Focus on the rhythm, tempo, and energy that these songs share.",
-        ]
-        angle = angles[i % len(angles)]
+    connections_str = "\n".join(connection_details) if connection_details else "General musical similarity"
 
-        prompt = f"""You are a music critic writing a 2-sentence explanation for why "{bridge['title']}" by {bridge['artist']} is a musical bridge between the user's songs.
+    # Vary the prompt angle per bridge
+    angles = [
+        "Focus on what makes this song a surprising or unexpected link.",
+        "Focus on the sonic texture and production choices that tie these together.",
+        "Focus on the rhythm, tempo, and energy that these songs share.",
+    ]
+    angle = angles[i % len(angles)]
+
+    return f"""You are a music critic writing a 2-sentence explanation for why "{bridge['title']}" by {bridge['artist']} is a musical bridge between the user's songs.
 
 Per-song connections:
 {connections_str}
@@ -214,31 +291,60 @@ Rules:
 
 Explanation:"""
 
+
+def _clean_explanation(content):
+    explanation = content.strip()
+    # Strip any quotes the LLM might wrap it in
+    if explanation.startswith('"') and explanation.endswith('"'):
+        explanation = explanation[1:-1]
+    return explanation
+
+
+def _fallback_explanation(bridge):
+    traits_sample = bridge["shared_traits"][:3]
+    return f"Shares {', '.join(traits_sample)} with your input songs."
+
+
+def _recommendation(bridge, explanation):
+    return {
+        "title": bridge["title"],
+        "artist": bridge["artist"],
+        "shared_traits": bridge["shared_traits"],
+        "trait_count": bridge["trait_count"],
+        "explanation": explanation
+    }
+
+
+def generate_individual_explanations(song_titles, bridges):
+    """
+    Generate a unique explanation for each bridge recommendation.
+    Uses per-seed trait connections for specificity.
+    """
+    if not bridges:
+        return []
+
+    recommendations = []
+    for i, bridge in enumerate(bridges):
         try:
-            response = llm.invoke(prompt)
-            explanation = response.content.strip()
-            # Strip any quotes the LLM might wrap it in
-            if explanation.startswith('"') and explanation.endswith('"'):
-                explanation = explanation[1:-1]
+            response = llm.invoke(_explanation_prompt(bridge, i))
+            explanation = _clean_explanation(response.content)
         except Exception as e:
             print(f"LLM error for {bridge['title']}: {e}")
-            traits_sample = bridge["shared_traits"][:3]
-            explanation = f"Shares {', '.join(traits_sample)} with your input songs."
+            explanation = _fallback_explanation(bridge)
 
-        recommendations.append({
-            "title": bridge["title"],
-            "artist": bridge["artist"],
-            "shared_traits": bridge["shared_traits"],
-            "trait_count": bridge["trait_count"],
-            "explanation": explanation
-        })
+        recommendations.append(_recommendation(bridge, explanation))
 
     return recommendations
 
-def find_musical_bridge(song_titles, input_artists=None):
+NO_BRIDGES_SUMMARY = "No bridge songs found that share traits with all your input songs. Try choosing songs with more musical overlap."
+
+
+def find_musical_bridge(song_titles, input_artists=None, timer=None):
     """
     Main entry point - takes list of 2-3 song titles and returns structured recommendations.
+    `timer` (PhaseTimer) records the "bridges" and "explain" phases.
     """
+    timer = timer or PhaseTimer()
     if not isinstance(song_titles, list) or len(song_titles) < 2 or len(song_titles) > 3:
         return {
             "error": "Please provide 2-3 songs as a list",
@@ -248,15 +354,19 @@ def find_musical_bridge(song_titles, input_artists=None):
 
     print(f"Finding bridges for: {song_titles}")
 
-    bridges = find_bridges(song_titles, input_artists)
+    with timer.phase("bridges"):
+        bridges = find_bridges(song_titles, input_artists)
 
     if not bridges:
         return {
             "recommendations": [],
-            "summary": "No bridge songs found that share traits with all your input songs. Try choosing songs with more musical overlap."
+            "summary": NO_BRIDGES_SUMMARY
         }
 
-    recommendations = generate_individual_explanations(song_titles, bridges)
+    _record_bridge_hits(bridges)
+
+    with timer.phase("explain"):
+        recommendations = generate_individual_explanations(song_titles, bridges)
 
     return {
         "recommendations": recommendations,
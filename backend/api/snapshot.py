@@ -0,0 +1,482 @@
+"""
+Compact on-disk graph snapshots for warm start.
+
+A snapshot is a directory of NumPy `.npy` columns (mmap-able, so processes
+loading the same snapshot share pages) plus a manifest.json:
+
+    songs      track_id/title/musical_key string tables, numeric DNA columns
+    artists    name/genre string tables
+    traits     value string table, type codes (see TRAIT_TYPES)
+    edges      performed_by / has_trait / similar_to as (n, 2) int32 index
+               pairs, plus similar_score
+
+String tables are stored as `<name>.bytes.npy` (UTF-8, uint8) and
+`<name>.offsets.npy` (int64, n + 1), so no Python objects are pickled.
+
+`full-<ts>` snapshots hold the whole graph. `delta-<ts>` snapshots hold songs
+ingested after the previous snapshot's `until`, their edges, and whatever
+nodes those edges touch. Deltas do not record deletions (compact_graph) or
+edges added between two old songs; take a new full snapshot after those.
+"""
+import json
+import os
+import time
+import numpy as np
+from neomodel import db
+
+SNAPSHOT_VERSION = 1
+TRAIT_TYPES = ["tempo", "energy", "mood", "tempo_category", "vibe"]
+
+SONG_FLOAT_COLUMNS = ["energy", "valence", "ingested_at", "last_bridged_at"]
+SONG_INT_COLUMNS = ["bpm", "popularity"]
+
+
+class StringTable:
+    """
+    Read-only sequence of strings over a UTF-8 byte buffer and offsets.
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return bytes(self.data[start:end]).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def index(self):
+        """
+        {string: position}; built on demand since it is not mmap-able.
+        """
+        return {value: i for i, value in enumerate(self)}
+
+
+class GraphSnapshot:
+    """
+    A loaded snapshot. `songs`, `artists` and `traits` map column name to a
+    NumPy array or StringTable; `edges` maps relationship name to arrays.
+    """
+
+    def __init__(self, manifest, songs, artists, traits, edges):
+        self.manifest = manifest
+        self.songs = songs
+        self.artists = artists
+        self.traits = traits
+        self.edges = edges
+
+    def counts(self):
+        return {
+            "Song": len(self.songs["track_id"]),
+            "Artist": len(self.artists["name"]),
+            "Trait": len(self.traits["value"]),
+            "HAS_TRAIT": len(self.edges["has_trait"]),
+            "PERFORMED_BY": len(self.edges["performed_by"]),
+            "SIMILAR_TO": len(self.edges["similar_to"]),
+        }
+
+
+# --- ROWS <-> ARRAYS ---
+# "rows" is the keyed, mergeable form used for export, delta merging and
+# import: nodes keyed by their unique property, edges keyed by endpoint keys.
+
+def _empty_rows():
+    return {
+        "songs": {},         # track_id -> {title, bpm, ...}
+        "artists": {},       # name -> genre
+        "traits": {},        # value -> type
+        "performed_by": set(),   # (track_id, artist name)
+        "has_trait": set(),      # (track_id, trait value)
+        "similar_to": {},        # (track_id, track_id) -> score
+    }
+
+
+def _strings_to_arrays(values):
+    encoded = [(value or "").encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(e) for e in encoded])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return data, offsets
+
+
+def _pairs(keys, src_index, dst_index):
+    pairs = np.array(
+        [(src_index[src], dst_index[dst]) for src, dst in keys],
+        dtype=np.int32
+    )
+    return pairs.reshape(-1, 2)
+
+
+def _rows_to_columns(rows):
+    """
+    Returns {file stem: ndarray} for every column in the snapshot.
+    """
+    columns = {}
+    song_keys = list(rows["songs"])
+    songs = [rows["songs"][key] for key in song_keys]
+    artist_keys = list(rows["artists"])
+    trait_keys = list(rows["traits"])
+
+    for name, values in [
+        ("song_track_id", song_keys),
+        ("song_title", [s.get("title") for s in songs]),
+        ("song_musical_key", [s.get("musical_key") for s in songs]),
+        ("artist_name", artist_keys),
+        ("artist_genre", [rows["artists"][key] for key in artist_keys]),
+        ("trait_value", trait_keys),
+    ]:
+        columns[f"{name}.bytes"], columns[f"{name}.offsets"] = _strings_to_arrays(values)
+
+    for name in SONG_INT_COLUMNS:
+        columns[f"song_{name}"] = np.array(
+            [-1 if s.get(name) is None else s[name] for s in songs], dtype=np.int32
+        )
+    for name in SONG_FLOAT_COLUMNS:
+        # float64 so DNA round-trips exactly (compact_graph matches on it)
+        columns[f"song_{name}"] = np.array(
+            [np.nan if s.get(name) is None else s[name] for s in songs], dtype=np.float64
+        )
+    # -1 = unknown (songs ingested before the flag existed)
+    columns["song_is_shadow"] = np.array(
+        [-1 if s.get("is_shadow") is None else int(s["is_shadow"]) for s in songs], dtype=np.int8
+    )
+    columns["trait_type"] = np.array(
+        [TRAIT_TYPES.index(rows["traits"][key]) if rows["traits"][key] in TRAIT_TYPES else 255
+         for key in trait_keys],
+        dtype=np.uint8
+    )
+
+    song_index = {key: i for i, key in enumerate(song_keys)}
+    artist_index = {key: i for i, key in enumerate(artist_keys)}
+    trait_index = {key: i for i, key in enumerate(trait_keys)}
+    columns["edge_performed_by"] = _pairs(sorted(rows["performed_by"]), song_index, artist_index)
+    columns["edge_has_trait"] = _pairs(sorted(rows["has_trait"]), song_index, trait_index)
+    similar_keys = sorted(rows["similar_to"])
+    columns["edge_similar_to"] = _pairs(similar_keys, song_index, song_index)
+    columns["edge_similar_score"] = np.array(
+        [np.nan if rows["similar_to"][key] is None else rows["similar_to"][key] for key in similar_keys],
+        dtype=np.float64
+    )
+    return columns
+
+
+def _float_or_none(value):
+    return None if np.isnan(value) else float(value)
+
+
+def snapshot_to_rows(snapshot, rows=None):
+    """
+    Upsert a loaded snapshot into `rows` (a fresh one if not given).
+    """
+    rows = rows or _empty_rows()
+    songs, artists, traits, edges = snapshot.songs, snapshot.artists, snapshot.traits, snapshot.edges
+    track_ids = list(songs["track_id"])
+    artist_names = list(artists["name"])
+    trait_values = list(traits["value"])
+
+    for i, track_id in enumerate(track_ids):
+        is_shadow = int(songs["is_shadow"][i])
+        song = {"title": songs["title"][i], "musical_key": songs["musical_key"][i] or None,
+                "is_shadow": None if is_shadow < 0 else bool(is_shadow)}
+        for name in SONG_INT_COLUMNS:
+            song[name] = None if songs[name][i] < 0 else int(songs[name][i])
+        for name in SONG_FLOAT_COLUMNS:
+            song[name] = _float_or_none(songs[name][i])
+        rows["songs"][track_id] = song
+
+    for i, name in enumerate(artist_names):
+        rows["artists"][name] = artists["genre"][i] or None
+    for i, value in enumerate(trait_values):
+        code = int(traits["type"][i])
+        rows["traits"][value] = TRAIT_TYPES[code] if code < len(TRAIT_TYPES) else None
+
+    for s, a in edges["performed_by"]:
+        rows["performed_by"].add((track_ids[s], artist_names[a]))
+    for s, t in edges["has_trait"]:
+        rows["has_trait"].add((track_ids[s], trait_values[t]))
+    for (s, n), score in zip(edges["similar_to"], edges["similar_score"]):
+        rows["similar_to"][(track_ids[s], track_ids[n])] = _float_or_none(score)
+    return rows
+
+
+# --- EXPORT ---
+
+SONG_RETURN = """
+RETURN s.track_id, s.title, s.bpm, s.energy, s.valence, s.musical_key,
+       s.popularity, s.is_shadow, s.ingested_at, s.last_bridged_at
+"""
+
+# Songs ingested in (since, until]; since = null means everything up to until
+IN_WINDOW = "($since IS NULL OR coalesce(s.ingested_at, 0) > $since) AND coalesce(s.ingested_at, 0) <= $until"
+
+
+def _add_song(rows, row):
+    rows["songs"][row[0]] = {
+        "title": row[1], "bpm": row[2], "energy": row[3], "valence": row[4],
+        "musical_key": row[5], "popularity": row[6], "is_shadow": row[7],
+        "ingested_at": row[8], "last_bridged_at": row[9],
+    }
+
+
+def export_rows(since=None, until=None):
+    """
+    Read songs in the ingestion window, their edges and the nodes those
+    edges touch from Neo4j.
+    """
+    rows = _empty_rows()
+    params = {"since": since, "until": until if until is not None else time.time()}
+
+    results, _ = db.cypher_query(f"MATCH (s:Song) WHERE {IN_WINDOW} {SONG_RETURN}", params)
+    for row in results:
+        _add_song(rows, row)
+
+    results, _ = db.cypher_query(f"""
+        MATCH (s:Song)-[:PERFORMED_BY]->(a:Artist) WHERE {IN_WINDOW}
+        RETURN s.track_id, a.name, a.genre
+    """, params)
+    for track_id, name, genre in results:
+        rows["artists"][name] = genre
+        rows["performed_by"].add((track_id, name))
+
+    results, _ = db.cypher_query(f"""
+        MATCH (s:Song)-[:HAS_TRAIT]->(t:Trait) WHERE {IN_WINDOW}
+        RETURN s.track_id, t.value, t.type
+    """, params)
+    for track_id, value, trait_type in results:
+        rows["traits"][value] = trait_type
+        rows["has_trait"].add((track_id, value))
+
+    # SIMILAR_TO edges with at least one endpoint in the window; the other
+    # endpoint is included so edge indices always resolve inside the snapshot
+    window_n = IN_WINDOW.replace("s.", "n.")
+    results, _ = db.cypher_query(f"""
+        MATCH (s:Song)-[r:SIMILAR_TO]->(n:Song)
+        WHERE ({IN_WINDOW}) OR ({window_n})
+        RETURN s.track_id, n.track_id, r.score
+    """, params)
+    missing = set()
+    for src, dst, score in results:
+        rows["similar_to"][(src, dst)] = score
+        missing.update(key for key in (src, dst) if key not in rows["songs"])
+
+    if missing:
+        results, _ = db.cypher_query(
+            f"MATCH (s:Song) WHERE s.track_id IN $track_ids {SONG_RETURN}",
+            {"track_ids": list(missing)}
+        )
+        for row in results:
+            _add_song(rows, row)
+
+    if since is None:
+        # Full snapshots also keep nodes without songs
+        results, _ = db.cypher_query("MATCH (a:Artist) RETURN a.name, a.genre")
+        for name, genre in results:
+            rows["artists"].setdefault(name, genre)
+        results, _ = db.cypher_query("MATCH (t:Trait) RETURN t.value, t.type")
+        for value, trait_type in results:
+            rows["traits"].setdefault(value, trait_type)
+
+    return rows, params["until"]
+
+
+def write_snapshot(directory, rows, kind, since, until):
+    os.makedirs(directory, exist_ok=True)
+    for name, array in _rows_to_columns(rows).items():
+        np.save(os.path.join(directory, f"{name}.npy"), array)
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "kind": kind,
+        "since": since,
+        "until": until,
+        "trait_types": TRAIT_TYPES,
+        "counts": {
+            "Song": len(rows["songs"]),
+            "Artist": len(rows["artists"]),
+            "Trait": len(rows["traits"]),
+            "HAS_TRAIT": len(rows["has_trait"]),
+            "PERFORMED_BY": len(rows["performed_by"]),
+            "SIMILAR_TO": len(rows["similar_to"]),
+        },
+    }
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def snapshot_chain(root):
+    """
+    Latest full snapshot under `root` followed by the deltas that extend it,
+    as a list of directories in apply order.
+    """
+    manifests = []
+    for name in os.listdir(root) if os.path.isdir(root) else []:
+        directory = os.path.join(root, name)
+        if os.path.exists(os.path.join(directory, "manifest.json")):
+            manifests.append((directory, _read_manifest(directory)))
+
+    fulls = [m for m in manifests if m[1]["kind"] == "full"]
+    if not fulls:
+        return []
+    chain = [max(fulls, key=lambda m: m[1]["until"])]
+    deltas = {m[1]["since"]: m for m in manifests if m[1]["kind"] == "delta"}
+    while chain[-1][1]["until"] in deltas:
+        chain.append(deltas[chain[-1][1]["until"]])
+    return [directory for directory, _ in chain]
+
+
+def export_snapshot(root, delta=False):
+    """
+    Write a full snapshot, or a delta on top of the latest chain under `root`.
+    Returns (directory, manifest).
+    """
+    since = None
+    if delta:
+        chain = snapshot_chain(root)
+        if not chain:
+            raise ValueError(f"No full snapshot under {root} to take a delta from")
+        since = _read_manifest(chain[-1])["until"]
+
+    rows, until = export_rows(since=since)
+    kind = "delta" if delta else "full"
+    directory = os.path.join(root, f"{kind}-{int(until * 1000)}")
+    return directory, write_snapshot(directory, rows, kind, since, until)
+
+
+# --- LOAD ---
+
+def _snapshot_from_columns(manifest, columns):
+    def strings(name):
+        return StringTable(columns[f"{name}.bytes"], columns[f"{name}.offsets"])
+
+    songs = {
+        "track_id": strings("song_track_id"),
+        "title": strings("song_title"),
+        "musical_key": strings("song_musical_key"),
+        "is_shadow": columns["song_is_shadow"],
+    }
+    for name in SONG_INT_COLUMNS + SONG_FLOAT_COLUMNS:
+        songs[name] = columns[f"song_{name}"]
+    artists = {"name": strings("artist_name"), "genre": strings("artist_genre")}
+    traits = {"value": strings("trait_value"), "type": columns["trait_type"]}
+    edges = {
+        name: columns[f"edge_{name}"]
+        for name in ["performed_by", "has_trait", "similar_to", "similar_score"]
+    }
+    return GraphSnapshot(manifest, songs, artists, traits, edges)
+
+
+def _read_manifest(directory):
+    with open(os.path.join(directory, "manifest.json")) as f:
+        return json.load(f)
+
+
+def load_snapshot_dir(directory, mmap=True):
+    """
+    Load a single snapshot directory; arrays are memory-mapped by default.
+    """
+    manifest = _read_manifest(directory)
+    if manifest["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {manifest['version']}")
+
+    columns = {}
+    for filename in os.listdir(directory):
+        if not filename.endswith(".npy"):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            columns[filename[:-4]] = np.load(path, mmap_mode="r" if mmap else None)
+        except ValueError:
+            # Empty arrays cannot be memory-mapped
+            columns[filename[:-4]] = np.load(path)
+    return _snapshot_from_columns(manifest, columns)
+
+
+def load_snapshot(root, mmap=True):
+    """
+    Load the latest snapshot chain under `root`. With no deltas the result
+    stays memory-mapped; deltas are merged by key into in-memory arrays.
+    """
+    chain = snapshot_chain(root)
+    if not chain:
+        raise FileNotFoundError(f"No full snapshot under {root}")
+
+    base = load_snapshot_dir(chain[0], mmap=mmap)
+    if len(chain) == 1:
+        return base
+
+    rows = snapshot_to_rows(base)
+    for directory in chain[1:]:
+        snapshot_to_rows(load_snapshot_dir(directory, mmap=mmap), rows)
+
+    manifest = dict(base.manifest, kind="merged", until=_read_manifest(chain[-1])["until"])
+    return _snapshot_from_columns(manifest, _rows_to_columns(rows))
+
+
+# --- IMPORT INTO NEO4J ---
+
+def _batches(items, batch_size):
+    items = list(items)
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def import_rows(rows, batch_size=1000):
+    """
+    MERGE a snapshot back into Neo4j in batched transactions, e.g. to warm
+    start a fresh database. Existing nodes are updated, nothing is deleted.
+    """
+    for batch in _batches(rows["artists"].items(), batch_size):
+        db.cypher_query("""
+            UNWIND $batch AS row
+            MERGE (a:Artist {name: row.name})
+            SET a.genre = coalesce(row.genre, a.genre)
+        """, {"batch": [{"name": name, "genre": genre} for name, genre in batch]})
+
+    for batch in _batches(rows["traits"].items(), batch_size):
+        db.cypher_query("""
+            UNWIND $batch AS row
+            MERGE (t:Trait {value: row.value})
+            SET t.type = coalesce(row.type, t.type)
+        """, {"batch": [{"value": value, "type": trait_type} for value, trait_type in batch]})
+
+    for batch in _batches(rows["songs"].items(), batch_size):
+        db.cypher_query("""
+            UNWIND $batch AS row
+            MERGE (s:Song {track_id: row.track_id})
+            SET s += row.props
+        """, {"batch": [
+            {"track_id": track_id, "props": {k: v for k, v in song.items() if v is not None}}
+            for track_id, song in batch
+        ]})
+
+    for batch in _batches(rows["performed_by"], batch_size):
+        db.cypher_query("""
+            UNWIND $batch AS row
+            MATCH (s:Song {track_id: row[0]}), (a:Artist {name: row[1]})
+            MERGE (s)-[:PERFORMED_BY]->(a)
+        """, {"batch": [list(pair) for pair in batch]})
+
+    for batch in _batches(rows["has_trait"], batch_size):
+        db.cypher_query("""
+            UNWIND $batch AS row
+            MATCH (s:Song {track_id: row[0]}), (t:Trait {value: row[1]})
+            MERGE (s)-[:HAS_TRAIT]->(t)
+        """, {"batch": [list(pair) for pair in batch]})
+
+    for batch in _batches(rows["similar_to"].items(), batch_size):
+        db.cypher_query("""
+            UNWIND $batch AS row
+            MATCH (s:Song {track_id: row.src}), (n:Song {track_id: row.dst})
+            MERGE (s)-[r:SIMILAR_TO]->(n)
+            SET r.score = coalesce(row.score, r.score)
+        """, {"batch": [
+            {"src": src, "dst": dst, "score": score}
+            for (src, dst), score in batch
+        ]})
@@ -0,0 +1,223 @@
+"""
+Local stand-ins for Soundcharts, Last.fm and the Groq LLM, used by the load
+test harness so runs are repeatable, free and don't hit rate limits. Enable
+with USE_API_STANDINS=True (installed from ApiConfig.ready) or
+`manage.py loadtest --standins` for in-process targets.
+
+Each call sleeps for its service's STANDIN_LATENCY_MS (blocking in the sync
+path, asyncio.sleep in the async path) and returns deterministic data drawn
+from a small synthetic catalogue, so repeated seeds reuse graph nodes the
+way real traffic does. Neo4j is real, but because runs create synthetic
+songs and stamp last_bridged_at they are pointed at STANDIN_NEO4J_URI, a
+scratch database that must differ from the main NEO4J_URI.
+"""
+import asyncio
+import hashlib
+import time
+from types import SimpleNamespace
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from neomodel import config, db
+
+CATALOGUE_ARTISTS = 60
+TRACKS_PER_ARTIST = 10
+TAG_POOL = [
+    "electronic", "pop", "indie", "synthwave", "hip-hop", "dance", "rock", "chillout",
+    "soul", "house", "funk", "alternative", "80s", "dream pop", "r&b",
+]
+
+
+def _hash(*parts):
+    return int(hashlib.md5("|".join(p.lower() for p in parts).encode("utf-8")).hexdigest(), 16)
+
+
+def parse_latencies(raw):
+    """
+    Parse STANDIN_LATENCY_MS ("soundcharts=250,lastfm=150,llm=900") into
+    {service: ms}.
+    """
+    latencies = {}
+    for pair in raw.split(","):
+        if not pair.strip():
+            continue
+        service, sep, ms = pair.partition("=")
+        try:
+            if not sep or not service.strip():
+                raise ValueError
+            latencies[service.strip()] = float(ms)
+        except ValueError:
+            raise ImproperlyConfigured(
+                f"STANDIN_LATENCY_MS must be comma-separated service=ms pairs "
+                f"(e.g. soundcharts=250,lastfm=150,llm=900); got {pair!r}"
+            )
+    return latencies
+
+
+_latencies = {}
+
+
+def _latency(service):
+    return _latencies.get(service, 0) / 1000
+
+
+# --- DETERMINISTIC FAKE DATA ---
+
+def similar_tracks(artist_name, track_title, limit):
+    h = _hash(artist_name, track_title)
+    tracks = []
+    for i in range(limit):
+        artist = (h >> (i * 12)) % CATALOGUE_ARTISTS
+        track = (h >> (i * 12 + 6)) % TRACKS_PER_ARTIST
+        tracks.append((f"Stand-in Artist {artist}", f"Stand-in Track {artist}-{track}", round(1 - i * 0.15, 2)))
+    return tracks
+
+
+def top_tags(artist_name, track_title, limit=3):
+    h = _hash(artist_name, track_title)
+    return [TAG_POOL[(h >> (i * 5)) % len(TAG_POOL)] for i in range(limit)]
+
+
+def playcount(artist_name, track_title):
+    return _hash(artist_name, track_title, "plays") % 1_000_000
+
+
+def soundcharts_response(artist_name):
+    h = _hash(artist_name, "dna")
+    return {"items": [{
+        "tempo": 70 + h % 110,
+        "energy": (h >> 8) % 100 / 100,
+        "valence": (h >> 16) % 100 / 100,
+    }]}
+
+
+def explanation(prompt):
+    return "Stand-in explanation: the shared tempo and mood carry the transition. Production details are simulated."
+
+
+# --- SYNC STAND-INS (pylast / requests / ChatGroq shapes) ---
+
+class StandInTrack:
+
+    def __init__(self, artist_name, track_title):
+        self.artist_name = artist_name
+        self.track_title = track_title
+
+    def get_similar(self, limit=None):
+        time.sleep(_latency("lastfm"))
+        return [
+            SimpleNamespace(item=SimpleNamespace(artist=SimpleNamespace(name=a), title=t), match=m)
+            for a, t, m in similar_tracks(self.artist_name, self.track_title, limit or 5)
+        ]
+
+    def get_top_tags(self, limit=None):
+        time.sleep(_latency("lastfm"))
+        return [
+            SimpleNamespace(item=SimpleNamespace(get_name=lambda name=name: name), weight=100)
+            for name in top_tags(self.artist_name, self.track_title, limit or 3)
+        ]
+
+    def get_playcount(self):
+        time.sleep(_latency("lastfm"))
+        return playcount(self.artist_name, self.track_title)
+
+
+class StandInLastFM:
+
+    def get_track(self, artist_name, track_title):
+        # pylast's get_track is lazy too; latency is paid per method call
+        return StandInTrack(artist_name, track_title)
+
+
+class StandInLLM:
+
+    def invoke(self, prompt):
+        time.sleep(_latency("llm"))
+        return SimpleNamespace(content=explanation(prompt))
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(_latency("llm"))
+        return SimpleNamespace(content=explanation(prompt))
+
+
+def fetch_soundcharts(artist_name):
+    time.sleep(_latency("soundcharts"))
+    return soundcharts_response(artist_name)
+
+
+# --- ASYNC STAND-INS (api.async_pipeline helper signatures) ---
+
+async def _soundcharts_search(artist_name):
+    await asyncio.sleep(_latency("soundcharts"))
+    return soundcharts_response(artist_name)
+
+
+async def _lastfm_similar(artist_name, track_title, limit):
+    await asyncio.sleep(_latency("lastfm"))
+    return similar_tracks(artist_name, track_title, limit)
+
+
+async def _lastfm_top_tags(artist_name, track_title, limit=3):
+    await asyncio.sleep(_latency("lastfm"))
+    return top_tags(artist_name, track_title, limit)
+
+
+async def _lastfm_playcount(artist_name, track_title):
+    await asyncio.sleep(_latency("lastfm"))
+    return playcount(artist_name, track_title)
+
+
+_installed = False
+
+
+def use_scratch_database():
+    """
+    Point neomodel and the async pipeline at STANDIN_NEO4J_URI. Refuses to
+    run when it is unset or is the main database.
+    """
+    uri = settings.STANDIN_NEO4J_URI
+    if not uri or uri == settings.NEO4J_URI:
+        raise ImproperlyConfigured(
+            "API stand-ins write synthetic songs into Neo4j; set STANDIN_NEO4J_URI "
+            "(and STANDIN_NEO4J_USERNAME/PASSWORD) to a scratch database other than NEO4J_URI"
+        )
+    settings.NEO4J_URI = uri
+    settings.NEO4J_USER = settings.STANDIN_NEO4J_USER
+    settings.NEO4J_PASSWORD = settings.STANDIN_NEO4J_PASSWORD
+
+    # neomodel needs the credentials inside the URL
+    scheme, _, host = uri.partition("://")
+    config.DATABASE_URL = f"{scheme}://{settings.NEO4J_USER}:{settings.NEO4J_PASSWORD}@{host}"
+    db.set_connection(url=config.DATABASE_URL)
+
+
+def install():
+    """
+    Switch to the scratch database, then swap the external clients in the
+    sync and async pipelines for stand-ins.
+    """
+    global _installed, _latencies
+    if _installed:
+        return
+    latencies = parse_latencies(settings.STANDIN_LATENCY_MS)
+    use_scratch_database()
+    _latencies = latencies
+
+    from api import async_pipeline, crawler, ingestion, reasoning
+
+    network = StandInLastFM()
+    ingestion.lastfm_network = network
+    crawler.lastfm_network = network
+    ingestion.fetch_soundcharts = fetch_soundcharts
+
+    llm = StandInLLM()
+    reasoning.llm = llm
+    async_pipeline._make_llm = lambda http: llm
+
+    async_pipeline._soundcharts_search = _soundcharts_search
+    async_pipeline._lastfm_similar = _lastfm_similar
+    async_pipeline._lastfm_top_tags = _lastfm_top_tags
+    async_pipeline._lastfm_playcount = _lastfm_playcount
+
+    _installed = True
+    print(f"Using local API stand-ins against {settings.NEO4J_URI} "
+          f"(latency ms: {_latencies})")
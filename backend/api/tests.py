@@ -1,3 +1,694 @@
-from django.test import TestCase
+import asyncio
+import io
+import itertools
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from api import async_pipeline, crawler, standins, timing, trait_registry
+from api.management.commands import compact_graph
+from api.snapshot import (
+    _empty_rows, load_snapshot, snapshot_chain, snapshot_to_rows, write_snapshot,
+)
+from api.timing import PhaseTimer, parse_server_timing
+from api.trait_registry import TraitRegistry
 
-# Create your tests here.
+
+def _song(title, **overrides):
+    song = {
+        "title": title, "bpm": 120, "energy": 0.8, "valence": 0.5, "musical_key": "C",
+        "popularity": 42, "is_shadow": False, "ingested_at": 100.0, "last_bridged_at": None,
+    }
+    song.update(overrides)
+    return song
+
+
+def _sample_rows():
+    rows = _empty_rows()
+    rows["songs"]["daft_punk-one_more_time"] = _song("One More Time", ingested_at=10.5)
+    rows["songs"]["chic-le_freak"] = _song(
+        "Le Freak", bpm=118, energy=0.1 + 0.2, is_shadow=True, last_bridged_at=55.25
+    )
+    rows["artists"] = {"Daft Punk": "electronic", "Chic": "disco"}
+    rows["traits"] = {"upbeat": "tempo", "high energy": "energy", "funk": "vibe"}
+    rows["performed_by"] = {("daft_punk-one_more_time", "Daft Punk"), ("chic-le_freak", "Chic")}
+    rows["has_trait"] = {
+        ("daft_punk-one_more_time", "upbeat"),
+        ("chic-le_freak", "upbeat"),
+        ("chic-le_freak", "funk"),
+    }
+    rows["similar_to"] = {("daft_punk-one_more_time", "chic-le_freak"): 0.87}
+    return rows
+
+
+class GraphSnapshotTests(SimpleTestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _write(self, name, rows, kind="full", since=None, until=100.0):
+        write_snapshot(os.path.join(self.root, name), rows, kind, since, until)
+
+    def test_full_snapshot_round_trip(self):
+        rows = _sample_rows()
+        self._write("full-1", rows)
+
+        snapshot = load_snapshot(self.root)
+
+        self.assertEqual(snapshot_to_rows(snapshot), rows)
+        self.assertEqual(snapshot.counts()["HAS_TRAIT"], 3)
+        # 0.1 + 0.2 is not exactly 0.3; float64 columns must keep it as-is
+        self.assertEqual(snapshot_to_rows(snapshot)["songs"]["chic-le_freak"]["energy"], 0.1 + 0.2)
+
+    def test_delta_chain_merges_by_key(self):
+        self._write("full-1", _sample_rows(), until=100.0)
+
+        delta = _empty_rows()
+        delta["songs"]["chic-le_freak"] = _song("Le Freak", bpm=119, is_shadow=False, ingested_at=150.0)
+        delta["songs"]["lorde-royals"] = _song("Royals", ingested_at=160.0)
+        delta["artists"] = {"Lorde": "pop", "Chic": "disco"}
+        delta["traits"] = {"upbeat": "tempo"}
+        delta["performed_by"] = {("lorde-royals", "Lorde"), ("chic-le_freak", "Chic")}
+        delta["has_trait"] = {("lorde-royals", "upbeat")}
+        delta["similar_to"] = {("lorde-royals", "chic-le_freak"): 0.4}
+        self._write("delta-2", delta, kind="delta", since=100.0, until=200.0)
+
+        # Not chained: its since does not match the latest until
+        orphan = _empty_rows()
+        orphan["songs"]["orphan-song"] = _song("Orphan")
+        self._write("delta-3", orphan, kind="delta", since=999.0, until=1000.0)
+
+        self.assertEqual(
+            [os.path.basename(d) for d in snapshot_chain(self.root)], ["full-1", "delta-2"]
+        )
+
+        snapshot = load_snapshot(self.root)
+        merged = snapshot_to_rows(snapshot)
+
+        self.assertEqual(snapshot.manifest["kind"], "merged")
+        self.assertEqual(snapshot.manifest["until"], 200.0)
+        self.assertEqual(
+            set(merged["songs"]), {"daft_punk-one_more_time", "chic-le_freak", "lorde-royals"}
+        )
+        # Delta rows replace the base row for the same key
+        self.assertEqual(merged["songs"]["chic-le_freak"]["bpm"], 119)
+        self.assertFalse(merged["songs"]["chic-le_freak"]["is_shadow"])
+        self.assertEqual(merged["artists"]["Daft Punk"], "electronic")
+        self.assertEqual(len(merged["performed_by"]), 3)
+        self.assertIn(("lorde-royals", "upbeat"), merged["has_trait"])
+        self.assertEqual(merged["similar_to"], {
+            ("daft_punk-one_more_time", "chic-le_freak"): 0.87,
+            ("lorde-royals", "chic-le_freak"): 0.4,
+        })
+
+    def test_empty_graph(self):
+        self._write("full-1", _empty_rows())
+
+        snapshot = load_snapshot(self.root)
+
+        self.assertEqual(set(snapshot.counts().values()), {0})
+        self.assertEqual(snapshot_to_rows(snapshot), _empty_rows())
+
+    def test_null_columns_round_trip(self):
+        rows = _empty_rows()
+        # Legacy node: no DNA, no flag, no timestamps
+        rows["songs"]["legacy-song"] = _song(
+            "Legacy Song", bpm=None, energy=None, valence=None, musical_key=None,
+            popularity=None, is_shadow=None, ingested_at=None, last_bridged_at=None,
+        )
+        rows["songs"]["other-song"] = _song("Other Song")
+        rows["artists"] = {"Legacy Artist": None}
+        rows["traits"] = {"untyped": None}
+        rows["performed_by"] = {("legacy-song", "Legacy Artist")}
+        rows["has_trait"] = {("legacy-song", "untyped")}
+        rows["similar_to"] = {("legacy-song", "other-song"): None}
+        self._write("full-1", rows)
+
+        self.assertEqual(snapshot_to_rows(load_snapshot(self.root)), rows)
+
+    def test_no_full_snapshot(self):
+        self.assertEqual(snapshot_chain(self.root), [])
+        with self.assertRaises(FileNotFoundError):
+            load_snapshot(self.root)
+
+
+class FakeTraitDB:
+    """
+    Stands in for neomodel's db in api.trait_registry: Trait nodes are a
+    {value: element_id} dict and each query is dispatched by identity.
+    """
+
+    def __init__(self, values=()):
+        self._ids = (f"4:trait:{i}" for i in itertools.count())
+        self.traits = {value: next(self._ids) for value in values}
+        self.edges = set()
+        self.queries = []
+
+    def recreate(self, value):
+        """
+        Delete and re-create a trait, as compact_graph + a later ingest would.
+        """
+        self.traits[value] = next(self._ids)
+
+    def cypher_query(self, query, params):
+        if query is trait_registry.WARM_QUERY:
+            self.queries.append("warm")
+            return [[v, self.traits[v]] for v in params["values"] if v in self.traits], None
+        if query is trait_registry.RESOLVE_QUERY:
+            self.queries.append("resolve")
+            for trait in params["traits"]:
+                self.traits.setdefault(trait["value"], next(self._ids))
+            return [[t["value"], self.traits[t["value"]]] for t in params["traits"]], None
+        if query is trait_registry.CONNECT_QUERY:
+            self.queries.append("connect")
+            matched = [t for t in params["traits"] if self.traits.get(t["value"]) == t["id"]]
+            self.edges.update((params["song_id"], t["id"]) for t in matched)
+            return [[t["value"]] for t in matched], None
+        raise AssertionError(f"Unexpected query: {query}")
+
+
+class TraitRegistryTests(SimpleTestCase):
+    FIXED = [("upbeat", "tempo"), ("high energy", "energy"), ("happy", "mood")]
+
+    def setUp(self):
+        self.db = FakeTraitDB(value for value, _ in self.FIXED)
+        patcher = mock.patch.object(trait_registry, "db", self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.registry = TraitRegistry(self.FIXED, max_vibes=2)
+        self.song = SimpleNamespace(element_id="4:song:1")
+
+    def test_warm_then_single_query_per_song(self):
+        self.registry.connect(self.song, [("upbeat", "tempo"), ("happy", "mood")])
+        self.assertEqual(self.db.queries, ["warm", "connect"])
+
+        self.db.queries.clear()
+        self.registry.connect(self.song, [("upbeat", "tempo"), ("high energy", "energy")])
+        self.assertEqual(self.db.queries, ["connect"])
+
+        # A new vibe is created once, then served from the cache
+        self.db.queries.clear()
+        self.registry.connect(self.song, [("upbeat", "tempo"), ("funk", "vibe")])
+        self.registry.connect(self.song, [("upbeat", "tempo"), ("funk", "vibe")])
+        self.assertEqual(self.db.queries, ["resolve", "connect", "connect"])
+        self.assertIn((self.song.element_id, self.db.traits["funk"]), self.db.edges)
+
+    def test_vibes_evicted_lru_at_max_vibes(self):
+        self.registry.resolve([("funk", "vibe"), ("disco", "vibe")])
+        self.registry.resolve([("funk", "vibe")])          # funk is now most recent
+        self.registry.resolve([("house", "vibe")])         # evicts disco
+
+        self.db.queries.clear()
+        self.registry.resolve([("funk", "vibe"), ("house", "vibe")] + self.FIXED)
+        self.assertEqual(self.db.queries, [])
+
+        self.registry.resolve([("disco", "vibe")])
+        self.assertEqual(self.db.queries, ["resolve"])
+
+    def test_fixed_vocabulary_is_never_evicted(self):
+        self.registry.resolve(self.FIXED)
+        self.registry.resolve([(f"tag {i}", "vibe") for i in range(10)])
+
+        self.db.queries.clear()
+        self.registry.resolve(self.FIXED)
+        self.assertEqual(self.db.queries, [])
+
+    def test_connect_re_resolves_stale_ids(self):
+        self.registry.connect(self.song, [("funk", "vibe"), ("upbeat", "tempo")])
+        stale_id = self.db.traits["funk"]
+        self.db.recreate("funk")
+        self.db.edges.clear()
+        self.db.queries.clear()
+
+        self.registry.connect(self.song, [("funk", "vibe"), ("upbeat", "tempo")])
+
+        # Only the stale trait is retried
+        self.assertEqual(self.db.queries, ["connect", "resolve", "connect"])
+        self.assertEqual(self.db.edges, {
+            (self.song.element_id, self.db.traits["funk"]),
+            (self.song.element_id, self.db.traits["upbeat"]),
+        })
+        self.assertNotIn((self.song.element_id, stale_id), self.db.edges)
+
+        self.db.queries.clear()
+        self.registry.connect(self.song, [("funk", "vibe")])
+        self.assertEqual(self.db.queries, ["connect"])
+
+
+class PhaseTimerTests(SimpleTestCase):
+
+    def _timer(self, *ticks):
+        clock = iter(ticks)
+        patcher = mock.patch.object(timing.time, "perf_counter", lambda: next(clock))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return PhaseTimer()
+
+    def test_overlapping_phases_count_wall_clock_once(self):
+        # Three seeds: two fetches overlap (0-10, 2-12), the third runs later (20-25)
+        timer = self._timer(0, 10, 2, 12, 20, 25)
+        for _ in range(3):
+            with timer.phase("fetch"):
+                pass
+        self.assertEqual(timer.phases, {"fetch": 17000.0})
+
+    def test_header_round_trip(self):
+        timer = self._timer(0, 0.25, 1, 1.5)
+        with timer.phase("fetch"):
+            pass
+        with timer.phase("explain"):
+            pass
+        self.assertEqual(parse_server_timing(timer.header()), {"fetch": 250.0, "explain": 500.0})
+
+
+class StandInDatabaseTests(SimpleTestCase):
+
+    @override_settings(NEO4J_URI="neo4j+s://main.example", STANDIN_NEO4J_URI=None)
+    def test_refuses_without_scratch_database(self):
+        with self.assertRaises(ImproperlyConfigured):
+            standins.use_scratch_database()
+
+    @override_settings(NEO4J_URI="neo4j+s://main.example", STANDIN_NEO4J_URI="neo4j+s://main.example")
+    def test_refuses_main_database(self):
+        with self.assertRaises(ImproperlyConfigured):
+            standins.use_scratch_database()
+
+    def test_parses_latencies(self):
+        self.assertEqual(
+            standins.parse_latencies("soundcharts=250, lastfm=150,llm=900,"),
+            {"soundcharts": 250.0, "lastfm": 150.0, "llm": 900.0},
+        )
+
+    def test_rejects_malformed_latencies(self):
+        for raw in ("soundcharts", "lastfm=fast", "=250", "llm=1=2"):
+            with self.subTest(raw=raw), self.assertRaisesRegex(ImproperlyConfigured, "STANDIN_LATENCY_MS"):
+                standins.parse_latencies(raw)
+
+    @override_settings(STANDIN_LATENCY_MS="lastfm:150", STANDIN_NEO4J_URI="bolt://scratch:7687")
+    def test_install_validates_latencies_before_switching_database(self):
+        with mock.patch.object(standins, "use_scratch_database") as use_scratch:
+            with self.assertRaises(ImproperlyConfigured):
+                standins.install()
+        use_scratch.assert_not_called()
+        self.assertFalse(standins._installed)
+
+
+class FakeSongDB:
+    """
+    Stands in for neomodel's db in the compact_graph command: Songs are
+    dicts, and the stamp and stale-removal queries are evaluated in Python
+    (dispatched by query text). Every other query reports a count of 0.
+    """
+
+    def __init__(self, songs):
+        self.songs = songs
+        self.queries = []
+        self.stale_queries = {
+            compact_graph.Command()._removal_query(compact_graph.STALE_MATCH, archive): archive
+            for archive in (False, True)
+        }
+
+    @staticmethod
+    def is_shadow(song):
+        if song.get("is_shadow") is not None:
+            return song["is_shadow"]
+        return all(song.get(key) == value for key, value in
+                   {"bpm": 120, "energy": 0.7, "valence": 0.5}.items())
+
+    def cypher_query(self, query, params=None):
+        params = params or {}
+        self.queries.append(query)
+        if query == compact_graph.STAMP_UNSTAMPED_QUERY:
+            songs = [s for s in self.songs if self.is_shadow(s) and s.get("ingested_at") is None]
+            for song in songs[:params["batch"]]:
+                song["ingested_at"] = params["now"]
+            return [[len(songs[:params["batch"]])]], None
+        if query in self.stale_queries:
+            stale = [
+                s for s in self.songs
+                if self.is_shadow(s)
+                and (s.get("last_bridged_at") or 0) < params["cutoff"]
+                and s.get("ingested_at") is not None and s["ingested_at"] < params["cutoff"]
+            ][:params["batch"]]
+            for song in stale:
+                self.songs.remove(song)
+            return [[len(stale)]], None
+        return [[0]], None
+
+
+class CompactGraphTests(SimpleTestCase):
+
+    def _compact(self, songs, **options):
+        fake = FakeSongDB(songs)
+        with mock.patch.object(compact_graph, "db", fake):
+            call_command(
+                "compact_graph", probes=0, max_songs=0, window_days=30,
+                stdout=io.StringIO(), **options
+            )
+        return fake
+
+    def test_run_batched_stops_on_empty_batch(self):
+        fake = mock.Mock()
+        fake.cypher_query.side_effect = [([[3]], None), ([[3]], None), ([[0]], None)]
+        with mock.patch.object(compact_graph, "db", fake):
+            total = compact_graph._run_batched("QUERY", {"x": 1}, batch_size=3)
+
+        self.assertEqual(total, 6)
+        self.assertEqual(fake.cypher_query.call_count, 3)
+        self.assertEqual(fake.cypher_query.call_args.args, ("QUERY", {"x": 1, "batch": 3}))
+
+    def test_run_batched_limit_caps_total(self):
+        fake = mock.Mock()
+        fake.cypher_query.side_effect = lambda query, params: ([[params["batch"]]], None)
+        with mock.patch.object(compact_graph, "db", fake):
+            total = compact_graph._run_batched("QUERY", {}, batch_size=4, limit=10)
+
+        self.assertEqual(total, 10)
+        self.assertEqual(
+            [call.args[1]["batch"] for call in fake.cypher_query.call_args_list], [4, 4, 2]
+        )
+
+    def test_removal_query_delete_vs_archive(self):
+        command = compact_graph.Command()
+        delete = command._removal_query(compact_graph.STALE_MATCH, archive=False)
+        archive = command._removal_query(compact_graph.STALE_MATCH, archive=True)
+
+        for query in (delete, archive):
+            self.assertTrue(query.startswith(compact_graph.STALE_MATCH))
+            self.assertIn("LIMIT $batch", query)
+        self.assertIn("DETACH DELETE s", delete)
+        self.assertNotIn("ArchivedSong", delete)
+        self.assertIn("REMOVE s:Song", archive)
+        self.assertIn("SET s:ArchivedSong", archive)
+        self.assertNotIn("DETACH DELETE", archive)
+
+    def test_archive_option_runs_archive_query(self):
+        command = compact_graph.Command()
+        delete = command._removal_query(compact_graph.STALE_MATCH, archive=False)
+        archive = command._removal_query(compact_graph.STALE_MATCH, archive=True)
+
+        fake = self._compact([], archive=True)
+        self.assertIn(archive, fake.queries)
+        self.assertNotIn(delete, fake.queries)
+
+        fake = self._compact([])
+        self.assertIn(delete, fake.queries)
+        self.assertNotIn(archive, fake.queries)
+
+    def test_unstamped_shadow_songs_start_their_window(self):
+        long_ago = 0.0
+        legacy_shadow = {"track_id": "legacy", "bpm": 120, "energy": 0.7, "valence": 0.5}
+        old_shadow = {"track_id": "old", "is_shadow": True, "ingested_at": long_ago}
+        seed = {"track_id": "seed", "is_shadow": False, "ingested_at": long_ago}
+
+        fake = self._compact([legacy_shadow, old_shadow, seed])
+
+        self.assertEqual([s["track_id"] for s in fake.songs], ["legacy", "seed"])
+        self.assertIsNotNone(legacy_shadow["ingested_at"])
+        self.assertLess(
+            fake.queries.index(compact_graph.STAMP_UNSTAMPED_QUERY),
+            fake.queries.index(next(iter(fake.stale_queries)))
+        )
+
+        # Still inside its window on the next run
+        fake = self._compact(fake.songs)
+        self.assertEqual([s["track_id"] for s in fake.songs], ["legacy", "seed"])
+
+
+class FakeCrawlWorld:
+    """
+    Last.fm, Neo4j and the clock as seen by api.crawler: `similar` maps a
+    track_id to its Last.fm neighbours, `stored` to its SIMILAR_TO edges.
+    Every ingest advances the clock by `ingest_seconds`.
+    """
+
+    def __init__(self, similar, songs=(), stored=None, ingest_seconds=0.0):
+        self.similar = similar
+        self.songs = {track_id: SimpleNamespace(track_id=track_id) for track_id in songs}
+        self.stored = stored or {}
+        self.ingest_seconds = ingest_seconds
+        self.now = 0.0
+        self.lastfm_calls = []
+        self.ingested = []
+        self.links = []
+        self.fail_links_to = set()
+
+    def node(self, artist_name, track_title):
+        track_id = crawler.track_id_for(artist_name, track_title)
+        return self.songs.setdefault(track_id, SimpleNamespace(track_id=track_id))
+
+    def get_track(self, artist_name, track_title):
+        def get_similar(limit):
+            self.lastfm_calls.append(track_title)
+            return [
+                SimpleNamespace(item=SimpleNamespace(artist=SimpleNamespace(name=a), title=t), match=m)
+                for a, t, m in self.similar.get(crawler.track_id_for(artist_name, track_title), [])[:limit]
+            ]
+        return SimpleNamespace(get_similar=get_similar)
+
+    def ingest_shadow_song(self, artist_name, track_title):
+        self.now += self.ingest_seconds
+        self.ingested.append(track_title)
+        return self.node(artist_name, track_title)
+
+    def neighbours_from_graph(self, track_id, limit):
+        return self.stored.get(track_id, [])[:limit]
+
+    def link(self, src_node, dst_node, score):
+        if dst_node.track_id in self.fail_links_to:
+            raise RuntimeError("Neo4j unavailable")
+        self.links.append((src_node.track_id, dst_node.track_id))
+
+    def patch_async(self, test):
+        """
+        The same world behind async_pipeline's crawl I/O, addressed by track_id.
+        """
+        async def lastfm_similar(artist_name, track_title, limit):
+            similar = self.get_track(artist_name, track_title).get_similar(limit)
+            return crawler._neighbours_from_lastfm(similar)
+
+        async def get_song(track_id):
+            return track_id if track_id in self.songs else None
+
+        async def ingest(artist_name, track_title):
+            return self.ingest_shadow_song(artist_name, track_title).track_id
+
+        async def graph_neighbours(track_id, limit):
+            return self.neighbours_from_graph(track_id, limit)
+
+        async def link(src_id, dst_id, score):
+            self.link(self.songs[src_id], self.songs[dst_id], score)
+
+        patches = [
+            mock.patch.object(async_pipeline, "_lastfm_similar", lastfm_similar),
+            mock.patch.object(async_pipeline, "_get_song", get_song),
+            mock.patch.object(async_pipeline, "_ingest_shadow_song", ingest),
+            mock.patch.object(async_pipeline, "_graph_neighbours", graph_neighbours),
+            mock.patch.object(async_pipeline, "_link", link),
+            mock.patch.object(crawler.time, "monotonic", lambda: self.now),
+        ]
+        for patcher in patches:
+            patcher.start()
+            test.addCleanup(patcher.stop)
+
+    def patch(self, test):
+        patches = [
+            mock.patch.object(crawler, "lastfm_network", SimpleNamespace(get_track=self.get_track)),
+            mock.patch.object(crawler, "ingest_shadow_song", self.ingest_shadow_song),
+            mock.patch.object(crawler, "_neighbours_from_graph", self.neighbours_from_graph),
+            mock.patch.object(crawler, "_link", self.link),
+            mock.patch.object(crawler, "Song", SimpleNamespace(
+                nodes=SimpleNamespace(get_or_none=lambda track_id: self.songs.get(track_id))
+            )),
+            mock.patch.object(crawler.time, "monotonic", lambda: self.now),
+        ]
+        for patcher in patches:
+            patcher.start()
+            test.addCleanup(patcher.stop)
+
+
+class CrawlSimilarTests(SimpleTestCase):
+    BUDGETS = {"max_depth": 3, "fanout": 5, "max_nodes": 100, "max_api_calls": 100, "time_budget": 60}
+
+    # root -> b, c; b -> d, e; c -> b, f
+    SIMILAR = {
+        "root-song": [("B", "b", 0.9), ("C", "c", 0.8)],
+        "b-b": [("D", "d", 0.7), ("E", "e", 0.6)],
+        "c-c": [("B", "b", 0.9), ("F", "f", 0.5)],
+    }
+
+    def _crawl(self, world, **budgets):
+        world.patch(self)
+        root = world.node("Root", "Song")
+        with mock.patch("builtins.print"):
+            return crawler.crawl_similar(root, "Root", "Song", **{**self.BUDGETS, **budgets})
+
+    def test_crawls_whole_neighbourhood_within_budgets(self):
+        world = FakeCrawlWorld(self.SIMILAR)
+        stats = self._crawl(world)
+
+        self.assertEqual(stats["stopped"], "frontier")
+        self.assertEqual(sorted(world.ingested), ["b", "c", "d", "e", "f"])
+        self.assertEqual(stats["api_calls"], 5 * crawler.SHADOW_INGEST_API_CALLS + len(world.lastfm_calls))
+
+    def test_node_budget(self):
+        world = FakeCrawlWorld(self.SIMILAR)
+        stats = self._crawl(world, max_nodes=3)
+
+        self.assertEqual(stats["stopped"], "nodes")
+        self.assertEqual(stats["nodes"], 3)
+        # Strongest first: b and c from the root, then b's best neighbour
+        self.assertEqual(world.ingested, ["b", "c", "d"])
+
+    def test_api_call_budget(self):
+        world = FakeCrawlWorld(self.SIMILAR)
+        # Root expansion (1) + one shadow ingest (2); the next ingest does not fit
+        stats = self._crawl(world, max_api_calls=1 + crawler.SHADOW_INGEST_API_CALLS + 1)
+
+        self.assertEqual(stats["stopped"], "api_calls")
+        self.assertEqual(world.ingested, ["b"])
+        self.assertLessEqual(stats["api_calls"], 1 + crawler.SHADOW_INGEST_API_CALLS + 1)
+
+    def test_time_budget(self):
+        world = FakeCrawlWorld(self.SIMILAR, ingest_seconds=1.0)
+        stats = self._crawl(world, time_budget=2.5)
+
+        self.assertEqual(stats["stopped"], "time")
+        self.assertEqual(world.ingested, ["b", "c", "d"])
+
+    def test_depth_cutoff(self):
+        world = FakeCrawlWorld(self.SIMILAR)
+        stats = self._crawl(world, max_depth=1)
+
+        self.assertEqual(world.lastfm_calls, ["Song"])
+        self.assertEqual(world.ingested, ["b", "c"])
+        self.assertEqual(stats["expanded"], 1)
+
+    def test_reuses_ingested_songs_without_api_cost(self):
+        world = FakeCrawlWorld(self.SIMILAR, songs=["b-b", "c-c"])
+        stats = self._crawl(world, max_depth=1)
+
+        self.assertEqual(world.ingested, [])
+        self.assertEqual(stats["reused"], 2)
+        self.assertEqual(stats["api_calls"], 1)
+        self.assertEqual(world.links, [("root-song", "b-b"), ("root-song", "c-c")])
+
+    def test_revisited_song_linked_but_not_re_expanded(self):
+        world = FakeCrawlWorld(self.SIMILAR)
+        self._crawl(world)
+
+        self.assertIn(("c-c", "b-b"), world.links)
+        self.assertEqual(world.lastfm_calls.count("b"), 1)
+        self.assertEqual(world.ingested.count("b"), 1)
+
+    def test_tops_up_nodes_with_fewer_stored_edges_than_fanout(self):
+        world = FakeCrawlWorld(
+            {"root-song": [("B", "b", 0.9), ("C", "c", 0.8), ("D", "d", 0.7)]},
+            stored={"root-song": [("B", "b", 0.9)]},
+        )
+        stats = self._crawl(world, max_depth=1, fanout=3)
+
+        self.assertEqual(world.lastfm_calls, ["Song"])
+        self.assertEqual(world.ingested, ["b", "c", "d"])
+        # The stored edge is not written again
+        self.assertEqual(world.links, [("root-song", "c-c"), ("root-song", "d-d")])
+        self.assertEqual(stats["nodes"], 3)
+
+    def test_full_stored_neighbourhood_skips_lastfm(self):
+        world = FakeCrawlWorld(self.SIMILAR, stored={"root-song": [("B", "b", 0.9), ("C", "c", 0.8)]})
+        self._crawl(world, max_depth=1, fanout=2)
+
+        self.assertEqual(world.lastfm_calls, [])
+        self.assertEqual(world.links, [])
+
+    def test_repeat_artist_expanded_after_novel_one(self):
+        world = FakeCrawlWorld({
+            "root-song": [("Root", "Other Song", 0.9), ("Z", "z", 0.6)],
+        })
+        self._crawl(world, max_depth=2)
+
+        # 0.9 by the seed's own artist is penalised below a novel 0.6
+        self.assertEqual(world.lastfm_calls, ["Song", "z", "Other Song"])
+
+    def test_neo4j_error_skips_song_not_crawl(self):
+        world = FakeCrawlWorld(self.SIMILAR)
+        world.fail_links_to = {"b-b"}
+        stats = self._crawl(world, max_depth=1)
+
+        self.assertEqual(world.links, [("root-song", "c-c")])
+        self.assertEqual(stats["nodes"], 1)
+
+
+class CrawlParityTests(SimpleTestCase):
+    """
+    crawl_similar and crawl_similar_async drive the same crawl_steps, so
+    with the same world and budgets they must build the same graph.
+    """
+    SIMILAR = {
+        "root-song": [("B", "b", 0.9), ("Root", "r2", 0.85), ("C", "c", 0.8)],
+        "b-b": [("C", "c", 0.7), ("D", "d", 0.6), ("E", "e", 0.55)],
+        "c-c": [("B", "b", 0.9), ("F", "f", 0.5)],
+        "r2-r2": [("G", "g", 0.4)],
+        "d-d": [("Root", "Song", 0.3), ("H", "h", 0.2)],
+    }
+    STORED = {"c-c": [("F", "f", 0.5)]}
+
+    def _worlds(self):
+        sync = FakeCrawlWorld(self.SIMILAR, songs=["e-e"], stored=self.STORED, ingest_seconds=1.0)
+        async_ = FakeCrawlWorld(self.SIMILAR, songs=["e-e"], stored=self.STORED, ingest_seconds=1.0)
+        for world in (sync, async_):
+            world.fail_links_to = {"f-f"}
+        return sync, async_
+
+    def _both(self, root_similar=None, **budgets):
+        sync, async_ = self._worlds()
+        budgets = {"max_depth": 3, "fanout": 3, "max_nodes": 50,
+                   "max_api_calls": 50, "time_budget": 60, **budgets}
+
+        with mock.patch("builtins.print"):
+            sync.patch(self)
+            root = sync.node("Root", "Song")
+            sync_stats = crawler.crawl_similar(
+                root, "Root", "Song",
+                root_similar=None if root_similar is None else sync.get_track("Root", "Song").get_similar(3),
+                **budgets
+            )
+            async_.patch_async(self)
+            async_.node("Root", "Song")
+            async_stats = asyncio.run(async_pipeline.crawl_similar_async(
+                "root-song", "Root", "Song",
+                root_similar=None if root_similar is None else self.SIMILAR["root-song"][:3],
+                **budgets
+            ))
+
+        self.assertEqual(sync_stats, async_stats)
+        self.assertEqual(sync.links, async_.links)
+        self.assertEqual(sync.ingested, async_.ingested)
+        self.assertEqual(len(sync.lastfm_calls) - (root_similar is not None),
+                         len(async_.lastfm_calls))
+        return sync_stats
+
+    def test_parity_unbounded(self):
+        self.assertEqual(self._both()["stopped"], "frontier")
+
+    def test_parity_with_prefetched_root(self):
+        self._both(root_similar=True)
+
+    def test_parity_node_budget(self):
+        self.assertEqual(self._both(max_nodes=4)["stopped"], "nodes")
+
+    def test_parity_api_budget(self):
+        self.assertEqual(self._both(max_api_calls=7)["stopped"], "api_calls")
+
+    def test_parity_time_budget(self):
+        self.assertEqual(self._both(time_budget=3.5)["stopped"], "time")
+
+    def test_parity_depth(self):
+        self._both(max_depth=1)
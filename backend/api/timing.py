@@ -0,0 +1,56 @@
+import time
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    """
+    Records the wall-clock time spent in each named phase of a request and
+    renders it as a Server-Timing header for the load-test harness.
+
+    A phase entered several times counts the union of its intervals: the
+    async view's concurrent seeds are counted once, the sync view's
+    sequential seeds add up, and no phase can exceed the request latency.
+    """
+
+    def __init__(self):
+        self.intervals = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.intervals.setdefault(name, []).append((start, time.perf_counter()))
+
+    @property
+    def phases(self):
+        """
+        {phase: ms} of wall-clock time covered by each phase.
+        """
+        phases = {}
+        for name, intervals in self.intervals.items():
+            total = 0.0
+            covered_until = float("-inf")
+            for start, end in sorted(intervals):
+                start = max(start, covered_until)
+                if end > start:
+                    total += end - start
+                covered_until = max(covered_until, end)
+            phases[name] = total * 1000
+        return phases
+
+    def header(self):
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.phases.items())
+
+
+def parse_server_timing(header):
+    """
+    {phase: ms} from a Server-Timing header produced by PhaseTimer.header().
+    """
+    phases = {}
+    for entry in (header or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        if name and params.startswith("dur="):
+            phases[name] = float(params[4:])
+    return phases
@@ -0,0 +1,132 @@
+import threading
+from collections import OrderedDict
+from neomodel import db
+
+WARM_QUERY = """
+MATCH (t:Trait) WHERE t.value IN $values
+RETURN t.value, elementId(t)
+"""
+
+RESOLVE_QUERY = """
+UNWIND $traits AS trait
+MERGE (t:Trait {value: trait.value})
+ON CREATE SET t.type = trait.type
+RETURN t.value, elementId(t)
+"""
+
+# Matching on value as well as elementId guards against IDs that Neo4j
+# reused after compact_graph deleted the trait they were cached for.
+CONNECT_QUERY = """
+MATCH (s:Song) WHERE elementId(s) = $song_id
+UNWIND $traits AS trait
+MATCH (t:Trait) WHERE elementId(t) = trait.id AND t.value = trait.value
+MERGE (s)-[:HAS_TRAIT]->(t)
+RETURN t.value
+"""
+
+
+class TraitRegistry:
+    """
+    Process-wide cache of Trait element IDs so HAS_TRAIT edges can be
+    created by ID instead of a get_or_create round trip per trait.
+
+    The fixed numeric vocabulary (tempo buckets, energy, mood, speed) is
+    looked up in one query on first use and never evicted; traits that do
+    not exist yet are created when a song first needs them. Vibe tags come
+    from Last.fm's long tail, so they live in an LRU capped at `max_vibes`.
+    """
+
+    def __init__(self, fixed_vocabulary, max_vibes):
+        self.fixed_vocabulary = list(fixed_vocabulary)
+        self.max_vibes = max_vibes
+        self._fixed = {}
+        self._vibes = OrderedDict()
+        self._warm = False
+        self._lock = threading.Lock()
+
+    def _get(self, value, trait_type):
+        if trait_type != "vibe":
+            return self._fixed.get(value)
+        element_id = self._vibes.get(value)
+        if element_id is not None:
+            self._vibes.move_to_end(value)
+        return element_id
+
+    def _put(self, value, trait_type, element_id):
+        if trait_type != "vibe":
+            self._fixed[value] = element_id
+            return
+        self._vibes[value] = element_id
+        self._vibes.move_to_end(value)
+        while len(self._vibes) > self.max_vibes:
+            self._vibes.popitem(last=False)
+
+    def _forget(self, value):
+        self._fixed.pop(value, None)
+        self._vibes.pop(value, None)
+
+    def _warm_up(self):
+        types = dict(self.fixed_vocabulary)
+        results, _ = db.cypher_query(WARM_QUERY, {"values": list(types)})
+        with self._lock:
+            for value, element_id in results:
+                self._put(value, types[value], element_id)
+            self._warm = True
+
+    def resolve(self, traits):
+        """
+        Map (value, type) pairs to Trait element IDs, creating missing
+        traits in a single batched MERGE. Returns {value: element_id}.
+        """
+        if not self._warm:
+            self._warm_up()
+
+        with self._lock:
+            resolved = {}
+            missing = {}
+            for value, trait_type in traits:
+                element_id = self._get(value, trait_type)
+                if element_id is None:
+                    missing[value] = trait_type
+                else:
+                    resolved[value] = element_id
+
+        if missing:
+            results, _ = db.cypher_query(RESOLVE_QUERY, {
+                "traits": [{"value": value, "type": trait_type} for value, trait_type in missing.items()]
+            })
+            with self._lock:
+                for value, element_id in results:
+                    self._put(value, missing[value], element_id)
+                    resolved[value] = element_id
+        return resolved
+
+    def connect(self, song_node, traits):
+        """
+        Connect song_node to every (value, type) trait in one query.
+        Cache entries whose node has gone are dropped and retried once.
+        """
+        traits = list(dict(traits).items())
+        if not traits:
+            return
+
+        for attempt in range(2):
+            resolved = self.resolve(traits)
+            results, _ = db.cypher_query(CONNECT_QUERY, {
+                "song_id": song_node.element_id,
+                "traits": [{"value": value, "id": resolved[value]} for value, _ in traits]
+            })
+            connected = {row[0] for row in results}
+            stale = [(value, trait_type) for value, trait_type in traits if value not in connected]
+            if not stale:
+                return
+            with self._lock:
+                for value, _ in stale:
+                    self._forget(value)
+            traits = stale
+
+    def clear(self):
+        with self._lock:
+            self._fixed.clear()
+            self._vibes.clear()
+            self._warm = False
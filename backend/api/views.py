@@ -1,8 +1,30 @@
 # views.py
+import asyncio
+import json
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from api.ingestion import ingest_track_with_dna
 from api.reasoning import find_musical_bridge
+from api.async_pipeline import ingest_track_async, find_musical_bridge_async, pipeline_clients
+from api.timing import PhaseTimer
+
+
+def _bridge_response(seeds, ingestion_log, result):
+    return {
+        "status": "success",
+        "ingestion_log": ingestion_log,
+        "recommendations": result.get("recommendations", []),
+        "summary": result.get("summary"),
+        "debug": {
+            "input_songs": [s['title'] for s in seeds],
+            "total_bridges_found": len(result.get("recommendations", []))
+        }
+    }
+
 
 @api_view(['POST'])
 def generate_bridge(request):
@@ -17,29 +39,67 @@ def generate_bridge(request):
         }, status=400)
     
     ingestion_log = []
+    timer = PhaseTimer()
     
     # Phase 1: Ingest both seeds
     for seed in seeds:
         result = ingest_track_with_dna(
             seed['artist'], 
             seed['title'],
-            ingest_similar=True
+            ingest_similar=True,
+            timer=timer
         )
         ingestion_log.append(result)
     
     # Phase 2: Find bridges using hardcoded query
     song_titles = [seed['title'] for seed in seeds]
     input_artists = [seed['artist'] for seed in seeds]
-    result = find_musical_bridge(song_titles, input_artists)
+    result = find_musical_bridge(song_titles, input_artists, timer=timer)
     
-    # Phase 3: Return structured response
-    return Response({
-        "status": "success",
-        "ingestion_log": ingestion_log,
-        "recommendations": result.get("recommendations", []),
-        "summary": result.get("summary"),
-        "debug": {
-            "input_songs": [s['title'] for s in seeds],
-            "total_bridges_found": len(result.get("recommendations", []))
-        }
-    })
\ No newline at end of file
+    # Phase 3: Return structured response (phase timings for `manage.py loadtest`)
+    return Response(
+        _bridge_response(seeds, ingestion_log, result),
+        headers={"Server-Timing": timer.header()}
+    )
+
+
+@csrf_exempt
+@require_POST
+async def generate_bridge_async(request):
+    """
+    Async endpoint: same contract as generate_bridge, but seeds are ingested
+    concurrently and the worker is free while waiting on external services.
+    Serve through core.asgi to get the concurrency benefit.
+    """
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    seeds = data.get('seeds', [])
+
+    if len(seeds) < 2 or len(seeds) > 3:
+        return JsonResponse({
+            "error": "Please provide 2-3 seed songs"
+        }, status=400)
+
+    timer = PhaseTimer()
+
+    # Only an ASGI server keeps this event loop (and its pooled clients) alive
+    async with pipeline_clients(keep_open=isinstance(request, ASGIRequest)):
+        # Phase 1: Ingest all seeds concurrently
+        ingestion_log = await asyncio.gather(*[
+            ingest_track_async(seed['artist'], seed['title'], ingest_similar=True, timer=timer)
+            for seed in seeds
+        ])
+
+        # Phase 2: Find bridges using hardcoded query
+        song_titles = [seed['title'] for seed in seeds]
+        input_artists = [seed['artist'] for seed in seeds]
+        result = await find_musical_bridge_async(song_titles, input_artists, timer=timer)
+
+    # Phase 3: Return structured response (phase timings for `manage.py loadtest`)
+    return JsonResponse(
+        _bridge_response(seeds, list(ingestion_log), result),
+        headers={"Server-Timing": timer.header()}
+    )
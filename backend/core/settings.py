@@ -147,4 +147,29 @@ SOUNDCHARTS_APP_ID = os.getenv("SOUNDCHARTS_APP_ID")
 SOUNDCHARTS_API_KEY = os.getenv("SOUNDCHARTS_API_KEY")
 LASTFM_API_KEY = os.getenv("LASTFM_API_KEY")
 LASTFM_SECRET = os.getenv("LASTFM_SECRET")
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
\ No newline at end of file
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# --- GRAPH COMPACTION POLICY (used by `manage.py compact_graph`) ---
+SHADOW_RETENTION_DAYS = int(os.getenv('SHADOW_RETENTION_DAYS', '30'))
+GRAPH_MAX_SONGS = int(os.getenv('GRAPH_MAX_SONGS', '0'))  # 0 = no cap
+
+# --- SHADOW GRAPH CRAWLER (request-time budgets; `manage.py crawl_graph` overrides) ---
+SHADOW_CRAWL_DEPTH = int(os.getenv('SHADOW_CRAWL_DEPTH', '1'))
+SHADOW_CRAWL_FANOUT = int(os.getenv('SHADOW_CRAWL_FANOUT', '5'))
+SHADOW_CRAWL_MAX_NODES = int(os.getenv('SHADOW_CRAWL_MAX_NODES', '5'))
+SHADOW_CRAWL_MAX_API_CALLS = int(os.getenv('SHADOW_CRAWL_MAX_API_CALLS', '12'))
+SHADOW_CRAWL_TIME_BUDGET = float(os.getenv('SHADOW_CRAWL_TIME_BUDGET', '10'))
+
+# --- ASYNC PIPELINE (/api/generate-bridge-async/, serve via core.asgi) ---
+ASYNC_HTTP_TIMEOUT = float(os.getenv('ASYNC_HTTP_TIMEOUT', '15'))
+
+# --- TRAIT REGISTRY (cached Trait element IDs; LRU size for Last.fm vibe tags) ---
+TRAIT_CACHE_SIZE = int(os.getenv('TRAIT_CACHE_SIZE', '2048'))
+
+# --- LOAD TESTING: local stand-ins for Soundcharts, Last.fm and the LLM (see api/standins.py) ---
+USE_API_STANDINS = os.getenv('USE_API_STANDINS', 'False') == 'True'
+# Stand-ins write synthetic songs, so they only run against a separate scratch database
+STANDIN_NEO4J_URI = os.getenv('STANDIN_NEO4J_URI')
+STANDIN_NEO4J_USER = os.getenv('STANDIN_NEO4J_USERNAME', NEO4J_USER)
+STANDIN_NEO4J_PASSWORD = os.getenv('STANDIN_NEO4J_PASSWORD', NEO4J_PASSWORD)
+# service=ms pairs; parsed by api.standins only when the stand-ins are installed
+STANDIN_LATENCY_MS = os.getenv('STANDIN_LATENCY_MS', 'soundcharts=250,lastfm=150,llm=900')
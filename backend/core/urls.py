@@ -16,9 +16,10 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from api.views import generate_bridge
+from api.views import generate_bridge, generate_bridge_async
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/generate-bridge/', generate_bridge, name='generate-bridge'),
+    path('api/generate-bridge-async/', generate_bridge_async, name='generate-bridge-async'),
 ]